@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # torch keeps one intra-op thread pool per process, so its size is
+        # set here, once, for every process that loads Django (servers, job
+        # workers, commands). The model warm-up only runs in the server
+        # entry points (wsgi.py, which runserver loads too, and asgi.py), not
+        # for migrate, shell or tests.
+        if settings.INFERENCE_THREADS:
+            import torch
+            torch.set_num_threads(settings.INFERENCE_THREADS)
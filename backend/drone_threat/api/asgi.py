@@ -0,0 +1,126 @@
+import asyncio
+import json
+import re
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .utils.event_hub import hub
+
+# Server-sent events for analysis jobs, served next to the Django ASGI app:
+#
+#   GET /api/jobs/<job_id>/events
+#
+# streams "snapshot" (trajectory snapshot every JSON_INTERVAL), "alert" (a
+# track turned malicious), "zone" (a track entered or left a no-fly zone),
+# "progress" (fraction of frames done, at most every PROGRESS_INTERVAL) and
+# "status" events until the job reaches a final state or the client goes
+# away. A client that reads too slowly loses its oldest pending events and is
+# sent a "dropped" event with the running count.
+
+EVENTS_PATH = re.compile(r'^/api/jobs/(?P<job_id>[0-9a-fA-F-]{36})/events/?$')
+HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments
+
+
+def encode_event(event, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+@sync_to_async
+def get_job_status(job_id):
+    from .models import AnalysisJob
+
+    job = AnalysisJob.objects.filter(pk=job_id).first()
+    return job.as_dict() if job is not None else None
+
+
+def response_headers():
+    headers = [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]
+    if getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+        headers.append((b'access-control-allow-origin', b'*'))
+    return headers
+
+
+async def send_plain(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def stream_job_events(job_id, receive, send):
+    # Subscribe before reading the job so no event published in between is lost
+    subscription = hub.subscribe(str(job_id))
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        status = await get_job_status(job_id)
+        if status is None:
+            await send_plain(send, 404, b'Job not found')
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers()})
+        await send({'type': 'http.response.body', 'body': encode_event('status', status), 'more_body': True})
+        final = status['status'] in ('succeeded', 'cancelled') or (
+            status['status'] == 'failed' and status['attempts'] >= status['max_attempts'])
+
+        dropped = 0
+        while not final and not disconnected.done():
+            next_message = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {next_message, disconnected}, timeout=HEARTBEAT_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if next_message not in done:
+                next_message.cancel()
+                if not disconnected.done():
+                    await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                continue
+
+            message = next_message.result()
+            if message is None:
+                break
+            if subscription.dropped != dropped:
+                dropped = subscription.dropped
+                await send({'type': 'http.response.body',
+                            'body': encode_event('dropped', {'count': dropped}), 'more_body': True})
+            await send({'type': 'http.response.body',
+                        'body': encode_event(message['event'], message['data']), 'more_body': True})
+            if message['event'] == 'status' and message['data'].get('final'):
+                final = True
+
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        subscription.close()
+
+
+def with_job_events(django_application):
+    # Wraps the Django ASGI application; every other request passes through.
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = EVENTS_PATH.match(scope['path'])
+            if match:
+                try:
+                    job_id = uuid.UUID(match['job_id'])
+                except ValueError:
+                    await send_plain(send, 404, b'Job not found')
+                    return
+                await stream_job_events(job_id, receive, send)
+                return
+        await django_application(scope, receive, send)
+
+    return application
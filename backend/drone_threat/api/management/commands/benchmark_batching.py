@@ -0,0 +1,82 @@
+import time
+
+import cv2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ultralytics import YOLO
+
+from api.utils.model_registry import get_model
+from api.utils.models_util import read_frames
+from api.utils.tracking import DRONE_CLASS_ID, ThreatTracker
+from api.utils.uploads import pre_processed_path
+
+
+def track_reference(weights, frames):
+    # Per-frame drone tracks from the pre-batching path: model.track() one
+    # frame at a time on a model of its own, as {track_id: box}. The tracker
+    # is named, since newer ultralytics releases default to another one.
+    model = YOLO(weights)
+    per_frame = []
+    for frame in frames:
+        results = model.track(frame, persist=True, verbose=False, tracker=settings.TRACKER_CONFIG)
+        boxes = results[0].boxes.cpu().numpy()
+        per_frame.append({
+            int(track_id): tuple(int(value) for value in box)
+            for track_id, box, cls in zip(boxes.id if boxes.id is not None else [], boxes.xyxy, boxes.cls)
+            if cls == DRONE_CLASS_ID
+        })
+    return per_frame
+
+
+class Command(BaseCommand):
+    help = "Compare detection + tracking throughput (frames/sec) across inference batch sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_name", help="Clip name in media/pre_processed (without .mp4)")
+        parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+        parser.add_argument("--max-frames", type=int, default=300)
+        parser.add_argument("--no-reference", action="store_true",
+                            help="Skip checking the tracks against per-frame model.track() output")
+
+    def handle(self, *args, **options):
+        cap = cv2.VideoCapture(pre_processed_path(options["file_name"]))
+        if not cap.isOpened():
+            raise CommandError(f"Could not open video file: {options['file_name']}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        # Decode once up front so only inference and tracking are measured.
+        frames, timestamps = read_frames(cap, options["max_frames"])
+        cap.release()
+        if not frames:
+            raise CommandError("Video has no frames")
+
+        model = get_model()
+        model.warm_up()
+
+        reference = None
+        if not options["no_reference"] and hasattr(model, "model"):
+            reference = track_reference(model.weights, frames)
+            tracked = sum(len(tracks) for tracks in reference)
+            self.stdout.write(f"model.track reference: {tracked} drone tracks over {len(frames)} frames")
+
+        baseline = None
+        for batch_size in options["batch_sizes"]:
+            threat_tracker = ThreatTracker(fps)
+            per_frame = []
+            start = time.perf_counter()
+            for i in range(0, len(frames), batch_size):
+                batch = frames[i:i + batch_size]
+                results = model.predict(batch)
+                for frame, current_time, result in zip(batch, timestamps[i:i + batch_size], results):
+                    current_trajectories = threat_tracker.update(result.boxes.cpu().numpy(), frame, current_time)
+                    per_frame.append({int(track_id): tuple(int(value) for value in data["box"])
+                                      for track_id, data in current_trajectories.items()})
+            elapsed = time.perf_counter() - start
+
+            frames_per_sec = len(frames) / elapsed
+            baseline = baseline or frames_per_sec
+            line = (f"batch={batch_size:<3d} frames={len(frames)} time={elapsed:.2f}s "
+                    f"fps={frames_per_sec:.1f} speedup={frames_per_sec / baseline:.2f}x")
+            if reference is not None:
+                same = sum(expected == actual for expected, actual in zip(reference, per_frame))
+                line += f" frames_matching_track={same}/{len(frames)}"
+            self.stdout.write(line)
@@ -0,0 +1,59 @@
+import cv2
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.commands.compare_backends import compare, run
+from api.utils.model_registry import get_model
+from api.utils.models_util import read_frames
+from api.utils.resolution import INFERENCE_MODES, ResolutionAdapter
+from api.utils.tracking import DRONE_CLASS_ID
+from api.utils.uploads import pre_processed_path
+
+
+def drones_only(detections):
+    return [(boxes[cls == DRONE_CLASS_ID], conf[cls == DRONE_CLASS_ID], cls[cls == DRONE_CLASS_ID])
+            for boxes, conf, cls in detections]
+
+
+class Command(BaseCommand):
+    help = ("Compare inference modes (native, downscale, tiled) on a clip: throughput, model inputs per "
+            "frame, and drone detections matched against the first mode's.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_name", help="Clip name in media/pre_processed (without .mp4)")
+        parser.add_argument("--modes", nargs="+", choices=INFERENCE_MODES, default=list(INFERENCE_MODES),
+                            help="The first is the reference")
+        parser.add_argument("--size", type=int, default=None, help="downscale size (default: settings.INFERENCE_SIZE)")
+        parser.add_argument("--max-frames", type=int, default=100)
+        parser.add_argument("--batch-size", type=int, default=1)
+        parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for two detections to match")
+
+    def handle(self, *args, **options):
+        cap = cv2.VideoCapture(pre_processed_path(options["file_name"]))
+        if not cap.isOpened():
+            raise CommandError(f"Could not open video file: {options['file_name']}")
+        frames = read_frames(cap, options["max_frames"])[0]
+        cap.release()
+        if not frames:
+            raise CommandError("Video has no frames")
+        height, width = frames[0].shape[:2]
+        self.stdout.write(f"{len(frames)} frames of {width}x{height}, batch={options['batch_size']}")
+
+        model = get_model()
+        model.warm_up()
+
+        reference = reference_time = None
+        for mode in options["modes"]:
+            adapter = ResolutionAdapter(model, mode=mode, size=options["size"])
+            detections, elapsed = run(adapter, frames, options["batch_size"])
+            detections = drones_only(detections)
+            drones = sum(len(boxes) for boxes, _, _ in detections)
+            line = (f"{mode:<10s} time={elapsed:.2f}s fps={len(frames) / elapsed:.1f} "
+                    f"inputs_per_frame={adapter.stats()['inputs_per_frame']:.1f} drones={drones}")
+            if reference is None:
+                reference, reference_time = detections, elapsed
+                line += " (reference)"
+            else:
+                accuracy = compare(reference, detections, options["iou"])
+                line += (f" speedup={reference_time / elapsed:.2f}x recall={accuracy['recall']:.3f} "
+                         f"precision={accuracy['precision']:.3f} mean_iou={accuracy['mean_iou']:.3f}")
+            self.stdout.write(line)
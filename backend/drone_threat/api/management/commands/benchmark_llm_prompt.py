@@ -0,0 +1,48 @@
+import json
+import os
+import time
+
+import ollama
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils.ollama_util import chat_structured, prepare_prompt
+from api.utils.trajectory_log import TrajectoryLogReader
+
+
+class Command(BaseCommand):
+    help = "Compare LLM prompt size (and, with --call, latency) for raw vs summarized trajectories."
+
+    def add_arguments(self, parser):
+        parser.add_argument("trajectory", help="Trajectory JSON file or .trajlog directory")
+        parser.add_argument("--call", action="store_true", help="Also send both prompts to Ollama")
+        parser.add_argument("--model", default=None)
+
+    def handle(self, *args, **options):
+        path = options["trajectory"]
+        if os.path.isdir(path):
+            trajectory = list(TrajectoryLogReader(path).snapshots())
+        elif os.path.exists(path):
+            with open(path) as f:
+                trajectory = json.load(f)
+        else:
+            raise CommandError(f"No such trajectory: {path}")
+        raw_json = json.dumps(trajectory, indent=2)
+
+        client = ollama.Client(host=settings.OLLAMA_HOST)
+        model = options["model"] or settings.OLLAMA_MODEL
+        for label, summarize in (("raw", False), ("summary", True)):
+            start = time.perf_counter()
+            prompt = prepare_prompt(raw_json, summarize=summarize)
+            build_time = time.perf_counter() - start
+            # ~4 characters per token for English/JSON text
+            line = (f"{label:<8} chars={len(prompt):<9d} ~tokens={len(prompt) // 4:<8d} "
+                    f"build={build_time * 1000:.1f}ms")
+
+            if options["call"]:
+                start = time.perf_counter()
+                result = chat_structured(client, model, prompt)
+                latency = time.perf_counter() - start
+                behaviour = result["Behaviour"] if result else None
+                line += f" latency={latency:.2f}s behaviour={behaviour!r}"
+            self.stdout.write(line)
@@ -0,0 +1,89 @@
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils.model_registry import get_model
+from api.utils.models_util import read_frames
+from api.utils.motion_gate import MotionGate
+from api.utils.tracking import ThreatTracker
+from api.utils.uploads import pre_processed_path
+
+
+def run(model, frames, timestamps, fps, gate=None):
+    # Per-frame list of (x, y, is_malicious) for every drone, and the time taken
+    threat_tracker = ThreatTracker(fps)
+    per_frame = []
+    start = time.perf_counter()
+    for frame, current_time in zip(frames, timestamps):
+        if gate is not None and not gate.should_infer(frame):
+            current_trajectories = threat_tracker.coast(current_time)
+        else:
+            result = model.predict(frame)[0]
+            current_trajectories = threat_tracker.update(result.boxes.cpu().numpy(), frame, current_time)
+        per_frame.append([(*data["position"], data["is_malicious"]) for data in current_trajectories.values()])
+    return per_frame, time.perf_counter() - start
+
+
+def compare(baseline, gated, radius):
+    # Greedy nearest-position matching per frame (track IDs differ between runs)
+    matched = errors = agree = baseline_total = gated_total = 0
+    for expected, actual in zip(baseline, gated):
+        baseline_total += len(expected)
+        gated_total += len(actual)
+        remaining = list(actual)
+        for x, y, malicious in expected:
+            if not remaining:
+                break
+            distances = [np.hypot(x - ax, y - ay) for ax, ay, _ in remaining]
+            best = int(np.argmin(distances))
+            if distances[best] <= radius:
+                matched += 1
+                errors += distances[best]
+                agree += remaining[best][2] == malicious
+                remaining.pop(best)
+    return {
+        "recall": matched / baseline_total if baseline_total else 1.0,
+        "precision": matched / gated_total if gated_total else 1.0,
+        "mean_error_px": errors / matched if matched else 0.0,
+        "verdict_agreement": agree / matched if matched else 1.0,
+    }
+
+
+class Command(BaseCommand):
+    help = "Measure motion-gated inference (skip ratio, speed, accuracy) against inferring every frame."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_name", help="Clip name in media/pre_processed (without .mp4)")
+        parser.add_argument("--max-frames", type=int, default=300)
+        parser.add_argument("--min-change", type=float, nargs="+", default=[None],
+                            help="MOTION_GATE_MIN_CHANGE values to try")
+        parser.add_argument("--match-radius", type=float, default=20, help="pixels")
+
+    def handle(self, *args, **options):
+        cap = cv2.VideoCapture(pre_processed_path(options["file_name"]))
+        if not cap.isOpened():
+            raise CommandError(f"Could not open video file: {options['file_name']}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames, timestamps = read_frames(cap, options["max_frames"])
+        cap.release()
+        if not frames:
+            raise CommandError("Video has no frames")
+
+        model = get_model()
+        model.warm_up()
+
+        baseline, baseline_time = run(model, frames, timestamps, fps)
+        self.stdout.write(f"baseline     frames={len(frames)} time={baseline_time:.2f}s")
+        for min_change in options["min_change"]:
+            gate = MotionGate(min_change=min_change)
+            gated, gated_time = run(model, frames, timestamps, fps, gate)
+            stats = gate.stats()
+            accuracy = compare(baseline, gated, options["match_radius"])
+            self.stdout.write(
+                f"min_change={gate.min_change:<8g} skip_ratio={stats['skip_ratio']:.2f} time={gated_time:.2f}s "
+                f"speedup={baseline_time / gated_time:.2f}x recall={accuracy['recall']:.3f} "
+                f"precision={accuracy['precision']:.3f} mean_error={accuracy['mean_error_px']:.1f}px "
+                f"verdict_agreement={accuracy['verdict_agreement']:.3f}"
+            )
@@ -0,0 +1,117 @@
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils.model_registry import get_model
+from api.utils.models_util import read_frames
+from api.utils.uploads import pre_processed_path
+
+
+def box_iou(a, b):
+    # Pairwise IoU of two (N, 4) and (M, 4) xyxy arrays
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def run(model, frames, batch_size):
+    # Per-frame (xyxy, confidence, class) arrays, and the time taken
+    detections = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        for result in model.predict(frames[i:i + batch_size]):
+            boxes = result.boxes.cpu().numpy()
+            detections.append((boxes.xyxy, boxes.conf, boxes.cls))
+    return detections, time.perf_counter() - start
+
+
+def compare(reference, candidate, iou_threshold):
+    # Greedy highest-IoU matching per frame between detections of the same class
+    matched = reference_total = candidate_total = 0
+    ious, conf_errors = [], []
+    for (ref_boxes, ref_conf, ref_cls), (boxes, conf, cls) in zip(reference, candidate):
+        reference_total += len(ref_boxes)
+        candidate_total += len(boxes)
+        if not len(ref_boxes) or not len(boxes):
+            continue
+        iou = box_iou(ref_boxes, boxes)
+        iou[ref_cls[:, None] != cls[None, :]] = 0
+        while True:
+            i, j = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[i, j] < iou_threshold:
+                break
+            matched += 1
+            ious.append(iou[i, j])
+            conf_errors.append(abs(ref_conf[i] - conf[j]))
+            iou[i, :] = 0
+            iou[:, j] = 0
+    return {
+        "recall": matched / reference_total if reference_total else 1.0,
+        "precision": matched / candidate_total if candidate_total else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+        "mean_conf_error": float(np.mean(conf_errors)) if conf_errors else 0.0,
+    }
+
+
+def parse_backend(spec):
+    # "onnxruntime:int8" -> {"backend": "onnxruntime", "precision": "int8"}
+    backend, _, precision = spec.partition(":")
+    return {"backend": backend, "precision": precision or None}
+
+
+class Command(BaseCommand):
+    help = ("Compare inference backends/precisions on recorded clips: throughput, and agreement of "
+            "their detections with the first backend's.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_names", nargs="*", help="Clip names in media/pre_processed (without .mp4)")
+        parser.add_argument("--pattern", default=None, help="Glob for clip names, instead of listing them")
+        parser.add_argument("--backends", nargs="+",
+                            default=["ultralytics:fp32", "onnxruntime:fp32", "onnxruntime:int8"],
+                            help="backend[:precision] entries; the first is the reference")
+        parser.add_argument("--max-frames", type=int, default=150, help="per clip")
+        parser.add_argument("--batch-size", type=int, default=1)
+        parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for two detections to match")
+
+    def handle(self, *args, **options):
+        clips = list(options["file_names"])
+        if options["pattern"]:
+            clips += sorted(os.path.splitext(os.path.basename(path))[0]
+                            for path in glob.glob(pre_processed_path(options["pattern"])))
+        if not clips:
+            raise CommandError("No clips given")
+
+        # Decode once up front so only inference is measured
+        frames = []
+        for name in clips:
+            cap = cv2.VideoCapture(pre_processed_path(name))
+            if not cap.isOpened():
+                raise CommandError(f"Could not open video file: {name}")
+            frames += read_frames(cap, options["max_frames"])[0]
+            cap.release()
+        if not frames:
+            raise CommandError("Clips have no frames")
+        self.stdout.write(f"{len(clips)} clips, {len(frames)} frames, batch={options['batch_size']}")
+
+        reference = reference_time = None
+        for spec in options["backends"]:
+            model = get_model(**parse_backend(spec))
+            model.warm_up()
+            detections, elapsed = run(model, frames, options["batch_size"])
+            line = f"{spec:<18s} time={elapsed:.2f}s fps={len(frames) / elapsed:.1f}"
+            if reference is None:
+                reference, reference_time = detections, elapsed
+                line += f" detections={sum(len(boxes) for boxes, _, _ in detections)} (reference)"
+            else:
+                accuracy = compare(reference, detections, options["iou"])
+                line += (f" speedup={reference_time / elapsed:.2f}x recall={accuracy['recall']:.3f} "
+                         f"precision={accuracy['precision']:.3f} mean_iou={accuracy['mean_iou']:.3f} "
+                         f"mean_conf_error={accuracy['mean_conf_error']:.4f}")
+            self.stdout.write(line)
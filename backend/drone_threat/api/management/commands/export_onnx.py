@@ -0,0 +1,64 @@
+import os
+import shutil
+
+import cv2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ultralytics import YOLO
+
+from api.utils.onnx_backend import int8_path, quantize_int8
+from api.utils.uploads import pre_processed_path
+
+
+def calibration_frames(clips, count):
+    # Frames spread evenly over the given clips, for INT8 calibration
+    per_clip = max(1, count // len(clips))
+    frames = []
+    for name in clips:
+        cap = cv2.VideoCapture(pre_processed_path(name))
+        if not cap.isOpened():
+            raise CommandError(f"Could not open video file: {name}")
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or per_clip
+        step = max(1, total // per_clip)
+        for index in range(0, total, step)[:per_clip]:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+class Command(BaseCommand):
+    help = "Export the YOLO weights to ONNX for the onnxruntime backend, optionally with an INT8 variant."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--weights", default=None, help="PyTorch weights (default: settings.YOLO_WEIGHTS)")
+        parser.add_argument("--output", default=None, help="ONNX file (default: settings.ONNX_WEIGHTS)")
+        parser.add_argument("--imgsz", type=int, default=640)
+        parser.add_argument("--int8", action="store_true", help="Also write the INT8 model (<output>.int8.onnx)")
+        parser.add_argument("--calibration", nargs="*", default=[],
+                            help="Clip names in media/pre_processed to calibrate INT8 activations on")
+        parser.add_argument("--calibration-frames", type=int, default=200)
+
+    def handle(self, *args, **options):
+        weights = options["weights"] or str(settings.YOLO_WEIGHTS)
+        output = options["output"] or str(settings.ONNX_WEIGHTS)
+        if options["int8"] and not options["calibration"]:
+            raise CommandError("--int8 needs --calibration clips")
+
+        # Dynamic axes let one model serve any batch size and frame shape
+        exported = YOLO(weights).export(format="onnx", imgsz=options["imgsz"], dynamic=True, simplify=False)
+        if os.path.abspath(exported) != os.path.abspath(output):
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            shutil.move(exported, output)
+        self.stdout.write(f"fp32: {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+        if options["int8"]:
+            frames = calibration_frames(options["calibration"], options["calibration_frames"])
+            if not frames:
+                raise CommandError("Calibration clips have no frames")
+            self.stdout.write(f"Calibrating on {len(frames)} frames")
+            path = quantize_int8(output, frames, int8_path(output), options["imgsz"])
+            self.stdout.write(f"int8: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
@@ -0,0 +1,135 @@
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import time
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.utils.model_registry import get_model
+from api.utils.models_util import detect_objects
+from api.utils.uploads import pre_processed_path, post_processed_path
+
+# Workers are forked after the model is loaded and warmed up in the parent,
+# so they all start from the same weights in copy-on-write memory instead of
+# each loading (and holding) its own copy. ONNX Runtime sessions start
+# their thread pools on load and do not survive a fork, so with that backend
+# each worker loads its own session instead.
+
+
+def done_marker(file_name):
+    return os.path.join(post_processed_path(), f"{file_name}.done")
+
+
+def worker_init(threads):
+    # One process per core: keep each worker's torch to its share of cores
+    # unless INFERENCE_THREADS says otherwise
+    threads = settings.INFERENCE_THREADS or threads
+    torch.set_num_threads(threads)
+    if settings.INFERENCE_BACKEND == "onnxruntime":
+        get_model(threads=threads).warm_up()
+
+
+def process_clip(task):
+    file_name, options = task
+    frames = 0
+
+    def count_frames(frames_done, total_frames):
+        nonlocal frames
+        frames = frames_done
+
+    start = time.perf_counter()
+    try:
+        # Snapshots are printed by detect_objects; keep the console readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            detect_objects(pre_processed_path(file_name), post_processed_path(), file_name,
+                           progress_callback=count_frames, **options)
+    except Exception as exc:
+        return {"file_name": file_name, "ok": False, "error": repr(exc), "pid": os.getpid(),
+                "frames": frames, "seconds": time.perf_counter() - start}
+
+    seconds = time.perf_counter() - start
+    record = {"file_name": file_name, "ok": True, "pid": os.getpid(), "frames": frames, "seconds": seconds}
+    # Written last and atomically: a clip counts as done only once all its
+    # outputs exist, so an interrupted run resumes with the unfinished clips.
+    marker = done_marker(file_name)
+    with open(marker + ".tmp", "w") as f:
+        json.dump(record, f)
+    os.replace(marker + ".tmp", marker)
+    return record
+
+
+class Command(BaseCommand):
+    help = "Process every clip in media/pre_processed with a pool of forked workers, skipping finished clips."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--pattern", default="*", help="Glob for clip names (without .mp4)")
+        parser.add_argument("--force", action="store_true", help="Re-process clips that are already done")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--video-output", choices=("encode", "deferred", "none"), default=None,
+                            help="Annotated video handling (default: settings.VIDEO_OUTPUT)")
+        parser.add_argument("--timing-report", action="store_true",
+                            help="Write a per-stage timing breakdown (<name>_timings.json) for each clip")
+
+    def handle(self, *args, **options):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise CommandError("process_archive needs the 'fork' start method")
+
+        paths = sorted(glob.glob(pre_processed_path(options["pattern"])))
+        clips = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+        pending = [name for name in clips if options["force"] or not os.path.exists(done_marker(name))]
+        skipped = len(clips) - len(pending)
+        self.stdout.write(f"{len(clips)} clips, {skipped} already done, {len(pending)} to process")
+        if not pending:
+            return
+        os.makedirs(post_processed_path(), exist_ok=True)
+
+        workers = max(1, min(options["workers"], len(pending)))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        if settings.INFERENCE_BACKEND != "onnxruntime":
+            get_model().warm_up()
+        # Forked children must not share the parent's database connections
+        connections.close_all()
+
+        clip_options = {"batch_size": options["batch_size"], "video_output": options["video_output"],
+                        "timing_report": options["timing_report"]}
+        results = []
+        start = time.perf_counter()
+        pool = multiprocessing.get_context("fork").Pool(workers, initializer=worker_init, initargs=(threads,))
+        try:
+            for record in pool.imap_unordered(process_clip, [(name, clip_options) for name in pending]):
+                results.append(record)
+                status = "ok" if record["ok"] else f"FAILED {record['error']}"
+                self.stdout.write(f"[{len(results)}/{len(pending)}] {record['file_name']}: {record['frames']} frames "
+                                  f"in {record['seconds']:.1f}s {status}")
+            pool.close()
+        except KeyboardInterrupt:
+            pool.terminate()
+            self.stdout.write("Interrupted; finished clips are kept and will be skipped on the next run")
+        finally:
+            pool.join()
+        self.write_summary(results, time.perf_counter() - start, workers)
+
+    def write_summary(self, results, wall_time, workers):
+        done = [record for record in results if record["ok"]]
+        failed = len(results) - len(done)
+        frames = sum(record["frames"] for record in done)
+
+        busy = {}
+        for record in done:
+            frames_and_seconds = busy.setdefault(record["pid"], [0, 0.0])
+            frames_and_seconds[0] += record["frames"]
+            frames_and_seconds[1] += record["seconds"]
+        per_worker = [f / s for f, s in busy.values() if s > 0]
+
+        self.stdout.write(
+            f"\n{len(done)} clips processed, {failed} failed, {workers} workers, wall time {wall_time:.1f}s\n"
+            f"throughput: {len(done) / wall_time * 3600:.1f} clips/hour, {frames / wall_time:.1f} frames/sec overall\n"
+            + (f"per worker: {sum(per_worker) / len(per_worker):.1f} frames/sec mean "
+               f"(min {min(per_worker):.1f}, max {max(per_worker):.1f})" if per_worker else "")
+        )
@@ -0,0 +1,51 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.utils.multi_camera import MultiCameraStream
+from api.utils.uploads import pre_processed_path
+
+
+def parse_source(spec, index):
+    # "[camera_id=]source"; cameras without an ID are numbered
+    camera_id, separator, source = spec.partition("=")
+    if not separator or "://" in camera_id:
+        camera_id, source = f"cam{index}", spec
+    if not os.path.exists(source) and os.path.exists(pre_processed_path(source)):
+        source = pre_processed_path(source)
+    return camera_id, source
+
+
+class Command(BaseCommand):
+    help = ("Run real-time detection on several live sources at once with one shared model, and print "
+            "trajectory snapshots (tagged with their camera) as JSON lines. Use --replay with clips to "
+            "simulate live feeds.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("sources", nargs="+",
+                            help="[camera_id=]source, where source is a stream URL, camera index, file path "
+                                 "or clip name in media/pre_processed")
+        parser.add_argument("--replay", action="store_true", help="Pace files at their native frame rate")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Cameras per inference call (default: settings.MULTI_CAMERA_BATCH_SIZE)")
+        parser.add_argument("--batch-wait", type=float, default=None,
+                            help="Seconds a partial batch waits (default: settings.MULTI_CAMERA_BATCH_WAIT)")
+
+    def handle(self, *args, **options):
+        sources = dict(parse_source(spec, index) for index, spec in enumerate(options["sources"]))
+        if len(sources) != len(options["sources"]):
+            raise CommandError("Camera IDs must be unique")
+
+        def print_alert(camera_id, alert):
+            self.stdout.write(json.dumps({"camera": camera_id, "alert": alert}, default=str))
+
+        stream = MultiCameraStream(sources, replay=options["replay"], batch_size=options["batch_size"],
+                                   batch_wait=options["batch_wait"], on_alert=print_alert)
+        try:
+            for snapshot in stream:
+                self.stdout.write(json.dumps(snapshot))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(json.dumps({"stats": stream.stats()}, indent=2))
@@ -0,0 +1,30 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from api.utils.streaming import LiveDetectionStream
+from api.utils.uploads import pre_processed_path
+
+
+class Command(BaseCommand):
+    help = ("Run real-time detection on a live source (RTSP/HTTP URL or camera index) and print "
+            "trajectory snapshots as JSON lines. Use --replay with a clip to simulate a live feed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Stream URL, camera index, file path or clip name in media/pre_processed")
+        parser.add_argument("--replay", action="store_true", help="Pace a file at its native frame rate")
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        if not os.path.exists(source) and os.path.exists(pre_processed_path(source)):
+            source = pre_processed_path(source)
+
+        stream = LiveDetectionStream(source, replay=options["replay"])
+        try:
+            for snapshot in stream:
+                self.stdout.write(json.dumps(snapshot))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(json.dumps({"stats": stream.stats()}, indent=2))
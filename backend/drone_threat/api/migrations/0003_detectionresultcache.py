@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_trajectoryanalysiscache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionResultCache',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255)),
+                ('source_digest', models.CharField(db_index=True, max_length=64)),
+                ('config_hash', models.CharField(db_index=True, max_length=64)),
+                ('result', models.JSONField()),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
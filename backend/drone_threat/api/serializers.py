@@ -0,0 +1,23 @@
+from rest_framework import serializers
+
+from .utils.jobs import JOB_OPTIONS
+from .utils.models_util import VIDEO_OUTPUTS
+
+
+class JobOptionsSerializer(serializers.Serializer):
+    # Options a job may be submitted with (see jobs.JOB_OPTIONS). Every one is
+    # optional; a missing or null option falls back to its setting. Use with
+    # partial=True so missing options stay missing instead of being filled
+    # in (form data would otherwise turn a missing boolean into False).
+    batch_size = serializers.IntegerField(min_value=1, allow_null=True)
+    motion_gate = serializers.BooleanField(allow_null=True)
+    adaptive_stride = serializers.BooleanField(allow_null=True)
+    video_output = serializers.ChoiceField(choices=VIDEO_OUTPUTS, allow_null=True)
+    timing_report = serializers.BooleanField()
+    use_cache = serializers.BooleanField(allow_null=True)
+
+    def validate(self, attrs):
+        unknown = sorted(set(self.initial_data) - set(JOB_OPTIONS))
+        if unknown:
+            raise serializers.ValidationError({key: "Unknown option." for key in unknown})
+        return attrs
@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import Future
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TransactionTestCase
+
+from api.asgi import stream_job_events
+from api.models import AnalysisJob
+from api.tests.test_job_events import HubForwarder, parse_events
+from api.utils import jobs
+from api.utils.event_hub import hub
+
+
+class QueuedJobCancelTests(TransactionTestCase):
+    # A job cancelled before any worker ran it must still end its event stream
+
+    def setUp(self):
+        self.job = AnalysisJob.objects.create(file_name="clip", options={}, max_attempts=1)
+        patcher = mock.patch.object(jobs, "_event_queue", HubForwarder())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def stream_while(self, cancel):
+        bodies = []
+        connected = asyncio.Event()
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                bodies.append(message["body"])
+                connected.set()
+
+        async def receive():
+            await asyncio.Event().wait()  # the client never leaves
+
+        stream = asyncio.ensure_future(stream_job_events(self.job.pk, receive, send))
+        await connected.wait()
+        await sync_to_async(cancel)()
+        await asyncio.wait_for(stream, 10)
+        return bodies
+
+    def assert_closed_as_cancelled(self, bodies):
+        events = parse_events(bodies)
+        self.assertEqual([(name, data["status"]) for name, data in events],
+                         [("status", "queued"), ("status", "cancelled")])
+        self.assertTrue(events[-1][1]["final"])
+        self.assertEqual(bodies[-1], b"")
+        self.assertEqual(hub.subscriber_count(str(self.job.pk)), 0)
+
+    def test_pending_future_cancelled(self):
+        future = Future()
+        with mock.patch.dict(jobs._futures, {self.job.pk: future}):
+            bodies = async_to_sync(self.stream_while)(lambda: jobs.cancel_job(self.job))
+        self.assertTrue(future.cancelled())
+        self.assert_closed_as_cancelled(bodies)
+
+    def test_worker_skips_cancelled_job(self):
+        def cancel():
+            # The future already belongs to a worker: it finds the request
+            # when it tries to claim the job
+            jobs.cancel_job(self.job)
+            jobs.run_job(self.job.pk)
+
+        bodies = async_to_sync(self.stream_while)(cancel)
+        self.assert_closed_as_cancelled(bodies)
+        self.assertEqual(AnalysisJob.objects.get(pk=self.job.pk).attempts, 0)
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import cv2
+import numpy as np
+import torch
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TransactionTestCase, override_settings
+from ultralytics.engine.results import Results
+
+from api.asgi import stream_job_events
+from api.models import AnalysisJob
+from api.utils import jobs, models_util
+from api.utils.event_hub import hub
+from api.utils.tracking import DRONE_CLASS_ID
+
+FPS = 10
+FRAMES = 40
+SIZE = (640, 480)
+OPTIONS = {"batch_size": 8, "video_output": "none", "motion_gate": False, "adaptive_stride": False,
+           "use_cache": False}
+
+
+class FakeModel:
+    # One drone flying right along y=250, 10 px per frame; it enters the
+    # no-fly zone (x 200-400) after about 15 frames
+    def __init__(self):
+        self.frames = 0
+
+    def predict(self, frames, imgsz=None):
+        results = []
+        for frame in frames:
+            x = 50 + 10 * self.frames
+            self.frames += 1
+            boxes = torch.tensor([[x - 15, 235, x + 15, 265, 0.9, DRONE_CLASS_ID]], dtype=torch.float32)
+            results.append(Results(frame, path="", names={DRONE_CLASS_ID: "drone"}, boxes=boxes))
+        return results
+
+
+class HubForwarder:
+    # Stands in for the worker-to-server event queue: delivers straight to the hub
+    def put(self, item):
+        channel, event, data = item
+        if event != "metrics":
+            hub.publish(channel, event, data)
+
+
+def parse_events(bodies):
+    events = []
+    for chunk in b"".join(bodies).decode().split("\n\n"):
+        if chunk.startswith("event: "):
+            event_line, data_line = chunk.split("\n", 1)
+            events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+class JobEventStreamTests(TransactionTestCase):
+    # Replays a short clip through a job and reads its server-sent events
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        for name in ("pre_processed", "post_processed"):
+            os.makedirs(os.path.join(media_root, name))
+        writer = cv2.VideoWriter(os.path.join(media_root, "pre_processed", "clip.mp4"),
+                                 cv2.VideoWriter_fourcc(*"mp4v"), FPS, SIZE)
+        for _ in range(FRAMES):
+            writer.write(np.zeros((SIZE[1], SIZE[0], 3), dtype=np.uint8))
+        writer.release()
+
+        media_settings = override_settings(MEDIA_ROOT=media_root, PRINT_SNAPSHOTS=False)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        # Progress is reported after every batch
+        for patcher in (mock.patch.object(models_util, "get_model", FakeModel),
+                        mock.patch.object(jobs, "_event_queue", HubForwarder()),
+                        mock.patch.object(jobs, "PROGRESS_INTERVAL", 0)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.job = AnalysisJob.objects.create(file_name="clip", options=OPTIONS, max_attempts=1)
+
+    async def replay(self, disconnect_after=None):
+        # Streams the job's events while it runs; the client goes away once
+        # it has received disconnect_after events, if given
+        bodies = []
+        received = asyncio.Event()
+        disconnect = asyncio.Event()
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                bodies.append(message["body"])
+                received.set()
+                if disconnect_after is not None and len(parse_events(bodies)) >= disconnect_after:
+                    disconnect.set()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        stream = asyncio.ensure_future(stream_job_events(self.job.pk, receive, send))
+        # The stream sends the job's current status once it has subscribed
+        await received.wait()
+        await sync_to_async(jobs.run_job)(self.job.pk)
+        await asyncio.wait_for(stream, 10)
+        return bodies
+
+    def test_events_arrive_in_order(self):
+        bodies = async_to_sync(self.replay)()
+        events = parse_events(bodies)
+        names = [name for name, _ in events]
+
+        self.assertEqual([data["status"] for name, data in events if name == "status"],
+                         ["queued", "running", "succeeded"])
+        self.assertEqual(names[-1], "status")
+        self.assertTrue(events[-1][1]["final"])
+        self.assertEqual(bodies[-1], b"", "the response is ended after the final status")
+
+        # Every snapshot the run logged, in order, and nothing else
+        job = AnalysisJob.objects.get(pk=self.job.pk)
+        snapshots = [data for name, data in events if name == "snapshot"]
+        self.assertEqual(snapshots, job.result["json_data"])
+
+        # Progress rises to 1 over the whole clip
+        progress = [data for name, data in events if name == "progress"]
+        self.assertEqual([data["frames_done"] for data in progress], list(range(8, FRAMES + 1, 8)))
+        self.assertEqual(progress[-1]["progress"], 1.0)
+
+        # The drone turns malicious once, when it enters the zone: the alert
+        # comes with the zone's enter event, between the last clean snapshot
+        # and the first flagged one; leaving the zone later is an exit event
+        alerts = [index for index, (name, _) in enumerate(events) if name == "alert"]
+        self.assertEqual(len(alerts), 1)
+        alert = events[alerts[0]][1]
+        self.assertEqual(events[alerts[0] + 1], ("zone", {"event": "enter", "track_id": alert["track_id"],
+                                                         "zone": "zone-0", "timestamp": alert["timestamp"]}))
+        self.assertEqual([data["event"] for name, data in events if name == "zone"], ["enter", "exit"])
+        before = [data for name, data in events[:alerts[0]] if name == "snapshot"]
+        after = [data for name, data in events[alerts[0]:] if name == "snapshot"]
+        self.assertTrue(before and after)
+        self.assertFalse(any(drone["is_malicious"] for snapshot in before for drone in snapshot["drones"]))
+        self.assertTrue(after[0]["drones"][0]["is_malicious"])
+        self.assertLess(before[-1]["timestamp"], alert["timestamp"])
+        self.assertLessEqual(alert["timestamp"], after[0]["timestamp"])
+
+        # A batch's progress comes after its snapshots, and before the next batch's
+        for index, (name, data) in enumerate(events):
+            if name == "progress":
+                later = [snapshot for name, snapshot in events[index + 1:] if name == "snapshot"]
+                self.assertTrue(all(round(snapshot["timestamp"] * FPS) >= data["frames_done"] for snapshot in later))
+
+        self.assertEqual(hub.subscriber_count(str(self.job.pk)), 0)
+
+    def test_client_disconnecting_partway(self):
+        bodies = async_to_sync(self.replay)(disconnect_after=4)
+        events = parse_events(bodies)
+
+        # The stream stops soon after the client leaves: at most one event
+        # already in flight follows, the final status never arrives and the
+        # response is not ended
+        self.assertIn(len(events), (4, 5))
+        self.assertFalse(any(name == "status" and data.get("final") for name, data in events))
+        self.assertNotEqual(bodies[-1], b"")
+        self.assertEqual(hub.subscriber_count(str(self.job.pk)), 0)
+
+        # The job itself is unaffected
+        job = AnalysisJob.objects.get(pk=self.job.pk)
+        self.assertEqual(job.status, AnalysisJob.SUCCEEDED)
+        self.assertTrue(job.result["json_data"])
@@ -0,0 +1,108 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import TrajectoryAnalysisCache
+from api.utils import ollama_util
+from api.utils.llm_cache import cache_stats, clear_cache
+
+ANSWER = {"Behaviour": "Normal Operation", "Confidence": 80, "Reasoning": "Straight, steady flight."}
+
+
+def trajectory(track_id=1, start_x=10):
+    return [
+        {"timestamp": t * 0.5, "drones": [
+            {"track_id": track_id, "x": start_x + 5 * t, "y": 100, "speed_kmph": 12.5,
+             "is_malicious": False, "confidence": 0.9},
+        ]}
+        for t in range(6)
+    ]
+
+
+class FakeClient:
+    # Stands in for ollama.Client: streams a fixed answer and counts calls
+    def __init__(self, answer=ANSWER):
+        self.answer = json.dumps(answer)
+        self.calls = 0
+
+    def chat(self, model, messages, format, stream):
+        self.calls += 1
+        return ({"message": {"content": part}} for part in (self.answer[:10], self.answer[10:]))
+
+
+class LLMCacheTests(TestCase):
+    def setUp(self):
+        clear_cache()
+        self.client_stub = FakeClient()
+        patcher = mock.patch.object(ollama_util.ollama, "Client", return_value=self.client_stub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def analyze(self, data):
+        return ollama_util.analyze_drone_trajectory(json.dumps(data))
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.analyze(trajectory()), ANSWER)
+        self.assertEqual(self.client_stub.calls, 1)
+        self.assertEqual(self.analyze(trajectory()), ANSWER)
+        self.assertEqual(self.client_stub.calls, 1)
+
+        stats = cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+        self.assertEqual(TrajectoryAnalysisCache.objects.get().hits, 1)
+
+    def test_equivalent_json_hits(self):
+        self.analyze(trajectory())
+        # Other whitespace and key order, same content
+        reordered = json.dumps([dict(reversed(list(snapshot.items()))) for snapshot in trajectory()], indent=2)
+        self.assertEqual(ollama_util.analyze_drone_trajectory(reordered), ANSWER)
+        self.assertEqual(self.client_stub.calls, 1)
+
+    def test_different_trajectory_misses(self):
+        self.analyze(trajectory())
+        self.analyze(trajectory(start_x=11))
+        self.assertEqual(self.client_stub.calls, 2)
+        self.assertEqual(cache_stats()["misses"], 2)
+
+    @override_settings(LLM_CACHE_TTL=60)
+    def test_expired_entry_is_a_miss(self):
+        self.analyze(trajectory())
+        TrajectoryAnalysisCache.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+
+        self.assertEqual(self.analyze(trajectory()), ANSWER)
+        self.assertEqual(self.client_stub.calls, 2)
+        stats = cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["entries"]), (0, 2, 1, 1))
+
+    @override_settings(LLM_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_is_evicted(self):
+        first, second, third = trajectory(start_x=10), trajectory(start_x=20), trajectory(start_x=30)
+        self.analyze(first)
+        self.analyze(second)
+        # Reading the first makes the second the least recently used
+        TrajectoryAnalysisCache.objects.update(last_used_at=timezone.now() - timedelta(seconds=10))
+        self.analyze(first)
+        self.analyze(third)
+
+        self.assertEqual(cache_stats()["evictions"], 1)
+        self.assertEqual(TrajectoryAnalysisCache.objects.count(), 2)
+        calls = self.client_stub.calls
+        self.analyze(first)
+        self.analyze(third)
+        self.assertEqual(self.client_stub.calls, calls)
+        self.analyze(second)
+        self.assertEqual(self.client_stub.calls, calls + 1)
+
+    def test_invalid_answer_is_not_cached(self):
+        self.client_stub.answer = "not an answer"
+        self.assertEqual(self.analyze(trajectory()), {"Behaviour": "", "Confidence": 0, "Reasoning": ""})
+        self.assertEqual(cache_stats()["entries"], 0)
+
+    def test_use_cache_false_skips_the_cache(self):
+        ollama_util.analyze_drone_trajectory(json.dumps(trajectory()), use_cache=False)
+        stats = cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (0, 0, 0))
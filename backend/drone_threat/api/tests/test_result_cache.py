@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.test import TestCase, override_settings
+
+from api.tests.test_streaming import SquareDetector
+from api.utils import models_util
+from api.utils.render_log import ensure_rendered, render_log_path
+from api.utils.result_cache import detect_objects_cached
+from api.utils.uploads import post_processed_path, pre_processed_path
+
+FPS = 10
+FRAMES = 20
+SIZE = (320, 240)
+NAME = "clip"
+
+
+def write_clip(path, left):
+    # A white square at x=left, moving right
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), FPS, SIZE)
+    for i in range(FRAMES):
+        frame = np.zeros((SIZE[1], SIZE[0], 3), dtype=np.uint8)
+        frame[100:140, left + 2 * i:left + 2 * i + 40] = 255
+        writer.write(frame)
+    writer.release()
+
+
+class DeferredRenderCacheTests(TestCase):
+    # Clips uploaded one after another under the same name must never be
+    # served another clip's outputs
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        for name in ("pre_processed", "post_processed"):
+            os.makedirs(os.path.join(media_root, name))
+        media_settings = override_settings(MEDIA_ROOT=media_root, RESULT_CACHE_DIR=os.path.join(media_root, "cache"),
+                                           INFERENCE_MODE="native", PRINT_SNAPSHOTS=False)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        patcher = mock.patch.object(models_util, "get_model", SquareDetector)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload_and_process(self, left, video_output="deferred"):
+        write_clip(pre_processed_path(NAME), left)
+        return detect_objects_cached(pre_processed_path(NAME), post_processed_path(), NAME, use_cache=True,
+                                     video_output=video_output)
+
+    def render(self):
+        return ensure_rendered(pre_processed_path(NAME), render_log_path(post_processed_path(), NAME),
+                               post_processed_path(NAME))
+
+    def rendered_square_left(self):
+        cap = cv2.VideoCapture(post_processed_path(NAME))
+        ret, frame = cap.read()
+        cap.release()
+        self.assertTrue(ret)
+        # The source square is the only near-white block wider than the drawn box outlines
+        columns = np.nonzero((frame > 200).all(axis=2).sum(axis=0) > 30)[0]
+        return int(columns.min())
+
+    def test_cache_hit_after_another_clip_is_rendered_again(self):
+        self.assertEqual(self.upload_and_process(20)["cache"], "miss")
+        self.assertTrue(self.render()["rendered"])
+        self.assertEqual(self.upload_and_process(200)["cache"], "miss")
+        self.assertTrue(self.render()["rendered"])
+        self.assertGreater(self.rendered_square_left(), 150)
+
+        # The first clip again: its log comes back from the cache, older than
+        # the second clip's video, which must not be served for it
+        self.assertEqual(self.upload_and_process(20)["cache"], "hit")
+        self.assertTrue(self.render()["rendered"])
+        self.assertLess(self.rendered_square_left(), 100)
+        self.assertFalse(self.render()["rendered"])
+
+    def test_runs_without_a_render_log_remove_the_old_one(self):
+        self.upload_and_process(20)
+        self.render()
+        log_path = render_log_path(post_processed_path(), NAME)
+
+        result = self.upload_and_process(200, video_output="none")
+        self.assertEqual(result["cache"], "miss")
+        self.assertFalse(os.path.exists(log_path))
+        self.assertFalse(os.path.exists(post_processed_path(NAME)))
+
+        # Same again from the cache, after another deferred run
+        self.upload_and_process(20)
+        self.render()
+        self.assertEqual(self.upload_and_process(200, video_output="none")["cache"], "hit")
+        self.assertFalse(os.path.exists(log_path))
+        self.assertFalse(os.path.exists(post_processed_path(NAME)))
@@ -0,0 +1,40 @@
+import importlib
+import sys
+from unittest import mock
+
+from django.apps import apps
+from django.test import SimpleTestCase, override_settings
+
+from api.utils import model_registry
+
+
+@override_settings(YOLO_WARMUP=True, INFERENCE_THREADS=0)
+class StartupTests(SimpleTestCase):
+    def setUp(self):
+        self.warm_up = mock.patch.object(model_registry, "warm_up_models").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_app_ready_does_not_warm_up(self):
+        # ready() runs for every manage.py command
+        apps.get_app_config("api").ready()
+        self.warm_up.assert_not_called()
+
+    def test_server_entry_points_warm_up(self):
+        for module in ("drone_threat.wsgi", "drone_threat.asgi"):
+            self.warm_up.reset_mock()
+            sys.modules.pop(module, None)
+            importlib.import_module(module)
+            self.warm_up.assert_called_once_with()
+
+    def test_loading_a_model_keeps_the_thread_count(self):
+        # torch's thread count is process-wide; only startup sets it
+        mock.patch.object(model_registry, "YOLO").start()
+        set_num_threads = mock.patch("torch.set_num_threads").start()
+        model_registry.LoadedModel("weights.pt", None, "fp32", threads=2)
+        set_num_threads.assert_not_called()
+
+    @override_settings(INFERENCE_THREADS=3)
+    def test_app_ready_sets_the_thread_count(self):
+        set_num_threads = mock.patch("torch.set_num_threads").start()
+        apps.get_app_config("api").ready()
+        set_num_threads.assert_called_once_with(3)
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import cv2
+import numpy as np
+import torch
+from django.test import SimpleTestCase, override_settings
+from ultralytics.engine.results import Results
+
+from api.utils import streaming
+from api.utils.tracking import DRONE_CLASS_ID
+
+FPS = 20
+FRAMES = 40
+SIZE = (640, 480)
+
+
+class SquareDetector:
+    # Detects the white square drawn on each frame, taking `delay` seconds
+    # per call like a model of that speed would
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def warm_up(self):
+        pass
+
+    def predict(self, frames, imgsz=None):
+        time.sleep(self.delay)
+        results = []
+        for frame in frames:
+            ys, xs = np.nonzero(frame[:, :, 0] > 128)
+            rows = [[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, 0.9, DRONE_CLASS_ID]] if len(xs) else []
+            boxes = torch.tensor(rows, dtype=torch.float32).reshape(-1, 6)
+            results.append(Results(frame, path="", names={DRONE_CLASS_ID: "drone"}, boxes=boxes))
+        return results
+
+
+@override_settings(INFERENCE_MODE="native")
+class LiveDetectionStreamTests(SimpleTestCase):
+    # A generated clip replayed at its native frame rate stands in for a camera
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.clip = os.path.join(directory, "clip.mp4")
+        background = np.random.default_rng(0).integers(0, 60, (SIZE[1], SIZE[0], 3), dtype=np.uint8)
+        writer = cv2.VideoWriter(self.clip, cv2.VideoWriter_fourcc(*"mp4v"), FPS, SIZE)
+        for i in range(FRAMES):
+            frame = background.copy()
+            frame[200:280, 100 + 4 * i:180 + 4 * i] = 255
+            writer.write(frame)
+        writer.release()
+
+    def replay(self, delay):
+        stream = streaming.LiveDetectionStream(self.clip, replay=True)
+        with mock.patch.object(streaming, "get_model", lambda: SquareDetector(delay)):
+            start = time.monotonic()
+            snapshots = list(stream)
+            elapsed = time.monotonic() - start
+        return stream, snapshots, elapsed
+
+    def test_replay_keeps_up_with_a_fast_detector(self):
+        stream, snapshots, elapsed = self.replay(delay=0.0)
+        stats = stream.stats()
+
+        # Paced like a camera, not read as fast as the file decodes
+        self.assertGreaterEqual(elapsed, (FRAMES - 1) / FPS)
+        self.assertEqual(stats["frames_read"], FRAMES)
+        self.assertEqual(stats["frames_processed"] + stats["frames_dropped"], FRAMES)
+
+        self.assertTrue(snapshots)
+        self.assertEqual([snapshot["timestamp"] for snapshot in snapshots],
+                         sorted(snapshot["timestamp"] for snapshot in snapshots))
+        self.assertTrue(all(len(snapshot["drones"]) == 1 for snapshot in snapshots))
+        self.assertTrue(all(snapshot["latency_ms"] >= 0 for snapshot in snapshots))
+        self.assertEqual(set(stats["latency_ms"]), {"p50", "p95", "max"})
+
+    def test_slow_detector_drops_frames_instead_of_lagging(self):
+        delay = 3 / FPS  # the detector manages about a third of the frames
+        stream, snapshots, elapsed = self.replay(delay=delay)
+        stats = stream.stats()
+
+        self.assertEqual(stats["frames_read"], FRAMES)
+        self.assertGreater(stats["frames_dropped"], 0)
+        self.assertLess(stats["frames_processed"], FRAMES / 2)
+        self.assertEqual(stats["frames_processed"] + stats["frames_dropped"], FRAMES)
+        self.assertTrue(snapshots)
+
+        # Only the newest frame is ever waiting: latency stays around one
+        # inference plus a frame interval rather than growing with a backlog
+        # (processing every frame would end about FRAMES * delay behind)
+        self.assertLess(stats["latency_ms"]["max"], 1000 * (2 * delay + 2 / FPS))
+        self.assertLess(elapsed, FRAMES / FPS + 3 * delay)
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import cv2
+import numpy as np
+import torch
+from django.test import SimpleTestCase, override_settings
+from ultralytics.engine.results import Results
+
+from api.utils import models_util
+from api.utils.tracking import DRONE_CLASS_ID
+
+FPS = 10
+FRAMES = 80
+SIZE = (640, 480)
+EMPTY_FRAMES = 10  # nothing in view before the drone appears
+START_X, STEP = 50, 5  # the drone's left edge, and how far it moves per frame
+SIDE = 80  # large and slow enough to track at the idle stride
+
+
+def frame_of(x):
+    return EMPTY_FRAMES + round((x - START_X) / STEP)
+
+
+class SquareDetector:
+    # Detects the white square drawn on each frame, from the pixels alone, so
+    # a frame gives the same detection whichever batch it is in. Records the
+    # source frames it saw.
+    def __init__(self):
+        self.seen = []
+
+    def predict(self, frames, imgsz=None):
+        results = []
+        for frame in frames:
+            ys, xs = np.nonzero(frame[:, :, 0] > 128)
+            rows = []
+            if len(xs):
+                rows.append([xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, 0.9, DRONE_CLASS_ID])
+                self.seen.append(frame_of(xs.min()))
+            boxes = torch.tensor(rows, dtype=torch.float32).reshape(-1, 6)
+            results.append(Results(frame, path="", names={DRONE_CLASS_ID: "drone"}, boxes=boxes))
+        return results
+
+
+@override_settings(INFERENCE_MODE="native", PRINT_SNAPSHOTS=False, STRIDE_IDLE=6, STRIDE_BENIGN=3, STRIDE_ALERT=1)
+class AdaptiveStrideTests(SimpleTestCase):
+    # The drone flies right along y=250, into the no-fly zone (x 200-400)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.clip = os.path.join(self.directory, "clip.mp4")
+        # A still, textured background gives the tracker's motion
+        # compensation something to match
+        background = np.random.default_rng(0).integers(0, 60, (SIZE[1], SIZE[0], 3), dtype=np.uint8)
+        writer = cv2.VideoWriter(self.clip, cv2.VideoWriter_fourcc(*"mp4v"), FPS, SIZE)
+        for i in range(FRAMES):
+            frame = background.copy()
+            if i >= EMPTY_FRAMES:
+                x = START_X + STEP * (i - EMPTY_FRAMES)
+                frame[210:210 + SIDE, x:x + SIDE] = 255
+            writer.write(frame)
+        writer.release()
+
+    def run_clip(self, batch_size, motion_gate=False):
+        detector = SquareDetector()
+        with mock.patch.object(models_util, "get_model", lambda: detector):
+            result = models_util.detect_objects(self.clip, self.directory, f"out{batch_size}", batch_size=batch_size,
+                                                adaptive_stride=True, motion_gate=motion_gate, video_output="none")
+        return result, detector.seen
+
+    def test_output_does_not_depend_on_batch_size(self):
+        for motion_gate in (False, True):
+            reference, _ = self.run_clip(1, motion_gate)
+            self.assertTrue(reference["json_data"])
+            for batch_size in (4, 16):
+                result, _ = self.run_clip(batch_size, motion_gate)
+                self.assertEqual(result["json_data"], reference["json_data"])
+                self.assertEqual(result["adaptive_stride"], reference["adaptive_stride"])
+                self.assertEqual(result["motion_gate"], reference["motion_gate"])
+
+    def test_every_frame_inferred_from_the_first_flagged_one(self):
+        result, seen = self.run_clip(16)
+        flagged = [snapshot["timestamp"] for snapshot in result["json_data"]
+                   if any(drone["is_malicious"] for drone in snapshot["drones"])]
+        self.assertTrue(flagged)
+        self.assertLess(result["adaptive_stride"]["inferred"], FRAMES)
+
+        # Verdicts only change on inferred frames, so the drone was flagged by
+        # the first flagged snapshot's frame; from then on nothing is skipped
+        first = round(flagged[0] * FPS)
+        last = round(flagged[-1] * FPS)
+        self.assertTrue(set(range(first, last + 1)) <= set(seen))
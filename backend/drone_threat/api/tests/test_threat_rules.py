@@ -0,0 +1,152 @@
+import json
+import os
+import random
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api.utils.rolling_stats import TrackFeatures
+from api.utils.tracking import ThreatTracker
+
+RECORDED = os.path.join(os.path.dirname(os.path.dirname(__file__)), "utils", "trajectory_data.json")
+
+
+def list_based_rules(points, thresholds):
+    # The window rules as they were before TrackFeatures: the trajectory
+    # list, including the current point, re-sliced on every update
+    if len(points) > 5:
+        x_vals = [p[0] for p in points[-5:]]
+        y_vals = [p[1] for p in points[-5:]]
+        if np.std(x_vals) > thresholds["erratic_std"] or np.std(y_vals) > thresholds["erratic_std"]:
+            return True
+
+    if len(points) > 10:
+        x_vals = [p[0] for p in points[-10:]]
+        y_vals = [p[1] for p in points[-10:]]
+        if max(x_vals) - min(x_vals) < thresholds["loiter_range"] and max(y_vals) - min(y_vals) < thresholds["loiter_range"]:
+            return True
+
+    if len(points) > 15:
+        x_vals = [p[0] for p in points[-15:]]
+        y_vals = [p[1] for p in points[-15:]]
+
+        centroid_x = sum(x_vals) / len(x_vals)
+        centroid_y = sum(y_vals) / len(y_vals)
+        distances = [np.sqrt((x - centroid_x)**2 + (y - centroid_y)**2) for x, y in zip(x_vals, y_vals)]
+        avg_distance = np.mean(distances)
+
+        if avg_distance < thresholds["circling_distance"]:
+            return True
+
+    return False
+
+
+def random_walk(rng, length, step, start=(320, 240)):
+    x, y = start
+    points = []
+    for _ in range(length):
+        x += rng.randint(-step, step)
+        y += rng.randint(-step, step)
+        points.append((x, y))
+    return points
+
+
+def circle(radius, length, center=(300, 200)):
+    angles = np.linspace(0, 2 * np.pi, length, endpoint=False)
+    return [(int(round(center[0] + radius * np.cos(a))), int(round(center[1] + radius * np.sin(a)))) for a in angles]
+
+
+class ThreatRuleEquivalenceTests(SimpleTestCase):
+    # ThreatTracker.is_malicious on incremental TrackFeatures must give the
+    # verdicts the list-based rules gave, after every point of a trajectory
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tracker = ThreatTracker(fps=30)
+
+    def assert_same_verdicts(self, points):
+        features = TrackFeatures()
+        for i, point in enumerate(points):
+            features.push(point, 0.0)
+            # Speed, zone and acceleration rules off: only the window rules decide
+            verdict = self.tracker.is_malicious(features, False, 0.0, 0.0)
+            expected = list_based_rules(points[:i + 1], self.tracker.thresholds)
+            self.assertEqual(verdict, expected, f"point {i} of {points}")
+
+    def test_seeded_random_walks(self):
+        rng = random.Random(1234)
+        # Step sizes around each threshold: loitering, circling and erratic
+        for step in (1, 2, 3, 5, 8, 12, 20, 40, 60):
+            for _ in range(20):
+                self.assert_same_verdicts(random_walk(rng, rng.randint(1, 40), step))
+
+    def recorded_tracks(self):
+        # {track_id: [(timestamp, x, y)]} from the snapshots of a real run
+        with open(RECORDED) as f:
+            snapshots = json.load(f)
+        tracks = {}
+        for snapshot in snapshots:
+            for drone in snapshot["drones"]:
+                tracks.setdefault(drone["track_id"], []).append((snapshot["timestamp"], drone["x"], drone["y"]))
+        return tracks
+
+    def test_recorded_trajectory(self):
+        for samples in self.recorded_tracks().values():
+            self.assert_same_verdicts([(x, y) for _, x, y in samples])
+
+    def test_recorded_trajectory_at_frame_rate(self):
+        # The recording holds one sample per second; filled in to 10 points
+        # per second it reaches every window, hovering near the circling
+        # distance
+        for samples in self.recorded_tracks().values():
+            if len(samples) < 2:
+                continue
+            times, xs, ys = (np.array(column, dtype=float) for column in zip(*samples))
+            frames = np.arange(times[0], times[-1] + 1e-9, 0.1)
+            points = list(zip(np.interp(frames, times, xs).astype(int), np.interp(frames, times, ys).astype(int)))
+            self.assertGreater(len(points), 16)
+            self.assert_same_verdicts([(int(x), int(y)) for x, y in points])
+
+    def test_circles_around_the_circling_distance(self):
+        for radius in np.arange(17, 24, 0.25):
+            self.assert_same_verdicts(circle(radius, 20))
+
+    def test_window_boundaries(self):
+        # Verdicts may only change once a window is more than full
+        erratic = [(0, 0), (100, 0)] * 3
+        self.assert_same_verdicts(erratic)
+        self.assertFalse(list_based_rules(erratic[:5], self.tracker.thresholds))
+        self.assertTrue(list_based_rules(erratic, self.tracker.thresholds))
+
+        still = [(50, 50)] * 17
+        self.assert_same_verdicts(still)
+        self.assertTrue(list_based_rules(still[:11], self.tracker.thresholds))
+
+    def test_std_tie(self):
+        # Population std of (0, 0, 50, 50, 75) is exactly 30: not erratic
+        self.assertEqual(np.std([0, 0, 50, 50, 75]), 30.0)
+        points = [(x, 100) for x in [0, 0, 0, 50, 50, 75]]
+        for trajectory in (points, [(y, x) for x, y in points]):
+            self.assert_same_verdicts(trajectory)
+            self.assertFalse(list_based_rules(trajectory, self.tracker.thresholds))
+        # Nudged past the tie it is erratic
+        self.assertTrue(list_based_rules(points[:-1] + [(76, 100)], self.tracker.thresholds))
+        self.assert_same_verdicts(points[:-1] + [(76, 100)])
+
+    def test_range_tie(self):
+        # A range of exactly loiter_range is not loitering; one less is
+        for spread in (9, 10, 11):
+            points = [(200 + (i % 2) * spread, 200 + ((i // 2) % 2) * spread) for i in range(14)]
+            self.assert_same_verdicts(points)
+            self.assertEqual(list_based_rules(points, self.tracker.thresholds), spread < 10)
+
+    def test_average_speed_matches_mean_of_last_five(self):
+        rng = random.Random(99)
+        features = TrackFeatures()
+        speeds = []
+        for _ in range(30):
+            speed = rng.uniform(0, 120)
+            speeds.append(speed)
+            features.push((0, 0), speed)
+            self.assertEqual(features.average_speed(), float(np.mean(speeds[-5:])))
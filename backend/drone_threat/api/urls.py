@@ -1,6 +1,13 @@
 from django.urls import path
-from .views import (process_video)
+from .views import (process_video, render_video, metrics, submit_job, job_status, job_progress, job_result, cancel_job)
 
 urlpatterns = [
     path('process_video/<str:file_name>', process_video),
+    path('render_video/<str:file_name>', render_video),
+    path('metrics', metrics),
+    path('jobs/submit/<str:file_name>', submit_job),
+    path('jobs/<uuid:job_id>', job_status),
+    path('jobs/<uuid:job_id>/progress', job_progress),
+    path('jobs/<uuid:job_id>/result', job_result),
+    path('jobs/<uuid:job_id>/cancel', cancel_job),
 ]
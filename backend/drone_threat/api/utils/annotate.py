@@ -0,0 +1,25 @@
+import cv2
+
+
+def draw_detections(frame, current_trajectories):
+    for track_id, data in current_trajectories.items():
+        x1, y1, x2, y2 = data["box"]
+        is_malicious = data["is_malicious"]
+        box_color = (0, 0, 255) if is_malicious else (0, 100, 0)
+        threat_text = "MALICIOUS DRONE - ALERT" if is_malicious else "Safe Drone"
+
+        cv2.rectangle(frame, (x1, y1), (x2, y2), box_color, 2)
+        text = f"ID: {track_id} | Speed: {data['speed_kmph']:.1f} km/h | Conf: {data['confidence']:.2f}"
+        cv2.putText(frame, text, (x1, y1 - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, box_color, 2)
+        cv2.putText(frame, threat_text, (x1, y1 - 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, box_color, 2)
+
+
+def draw_trajectories(frame, trajectories):
+    # One polylines call for every track, then a marker at each head
+    buffers = [buffer for buffer in trajectories.values() if len(buffer) > 1]
+    if buffers:
+        cv2.polylines(frame, [buffer.points() for buffer in buffers], False, (0, 255, 255), 2)
+        for buffer in buffers:
+            cv2.circle(frame, buffer.last(), 5, (255, 0, 0), -1)
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+# In-process publish/subscribe for pushing job events (trajectory snapshots,
+# malicious-drone alerts, status changes) to connected clients. Publishers may
+# be any thread; each subscriber is an asyncio queue bound to the event loop
+# that created it. Queues are bounded: when a subscriber falls behind, its
+# oldest undelivered messages are dropped so one slow client never holds back
+# the others or grows memory.
+
+_CLOSED = object()
+
+
+class Subscription:
+    def __init__(self, hub, channel, maxsize):
+        self.hub = hub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _offer(self, message):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        # Returns the next message, None when the channel was closed, or
+        # raises asyncio.TimeoutError.
+        message = await asyncio.wait_for(self.queue.get(), timeout)
+        return None if message is _CLOSED else message
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.maxsize)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, channel, event, data):
+        self._deliver(channel, {"event": event, "data": data})
+
+    def close(self, channel):
+        self._deliver(channel, _CLOSED)
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, message)
+            except RuntimeError:
+                # The subscriber's event loop has shut down
+                self.unsubscribe(subscription)
+
+
+hub = EventHub(settings.EVENT_SUBSCRIBER_QUEUE_SIZE)
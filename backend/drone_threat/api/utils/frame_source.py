@@ -0,0 +1,128 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+_EOF = object()
+_POLL_INTERVAL = 0.1
+
+
+class FrameSource:
+    # Decodes a cv2.VideoCapture on a background thread into a fixed pool of
+    # preallocated frame buffers (cap.read(image=buf) fills buf in place), so
+    # steady-state decoding allocates no frame memory. Every frame handed out
+    # must be given back with release() once the last stage is done with it;
+    # with every buffer in use the reader waits, which also bounds how far
+    # decoding can run ahead of the pipeline.
+    #
+    # A frame whose size differs from the pool (a stream changing resolution)
+    # is passed through unpooled; release() ignores it.
+
+    def __init__(self, cap, pool_size=None, timings=None):
+        self.cap = cap
+        self.timings = timings
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.pool_size = pool_size or settings.FRAME_POOL_SIZE
+        self._buffers = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.pool_size)]
+        self._pooled = {id(buf) for buf in self._buffers}
+        self._free = queue.Queue()
+        for buf in self._buffers:
+            self._free.put(buf)
+        self._ready = queue.Queue()
+        self._closed = threading.Event()
+        self.frames_read = 0
+        self.unpooled = 0
+        self.reader_waits = 0
+        self._thread = threading.Thread(target=self._read, name="frame-source", daemon=True)
+        self._thread.start()
+
+    def _acquire(self):
+        waited = False
+        while not self._closed.is_set():
+            try:
+                return self._free.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if not waited:
+                    self.reader_waits += 1
+                    waited = True
+        return None
+
+    def _read(self):
+        try:
+            while True:
+                buf = self._acquire()
+                if buf is None:
+                    return
+                start = time.perf_counter()
+                ret, frame = self.cap.read(image=buf)
+                if self.timings is not None:
+                    self.timings.add("decode", time.perf_counter() - start)
+                if not ret:
+                    self._free.put(buf)
+                    return
+                if frame is not buf:
+                    self._free.put(buf)
+                    self.unpooled += 1
+                self.frames_read += 1
+                self._ready.put((frame, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0))
+        except BaseException as exc:
+            self._ready.put(exc)
+        finally:
+            self._ready.put(_EOF)
+
+    def frames(self, should_stop=None):
+        # Yields (frame, timestamp) in decode order. should_stop lets a
+        # consumer that stops early (a failed pipeline) end the wait for
+        # frames that will never be released.
+        while True:
+            try:
+                item = self._ready.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self._closed.is_set() or (should_stop is not None and should_stop()):
+                    return
+                continue
+            if item is _EOF:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def batches(self, batch_size, should_stop=None):
+        # The pool must hold a whole batch or the reader could never fill one
+        if batch_size > self.pool_size:
+            raise ValueError(f"Frame pool of {self.pool_size} buffers cannot hold a batch of {batch_size}")
+        frames, timestamps = [], []
+        for frame, timestamp in self.frames(should_stop):
+            frames.append(frame)
+            timestamps.append(timestamp)
+            if len(frames) == batch_size:
+                yield frames, timestamps
+                frames, timestamps = [], []
+        if frames:
+            yield frames, timestamps
+
+    def release(self, frame):
+        if id(frame) in self._pooled:
+            self._free.put(frame)
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "pool_size": self.pool_size,
+            "frames_read": self.frames_read,
+            "unpooled": self.unpooled,
+            "reader_waits": self.reader_waits,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,257 @@
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .event_hub import hub
+from .metrics import registry
+
+# Local job subsystem: analysis jobs are rows in the AnalysisJob table and
+# run on a pool of worker processes owned by the web process. There is no
+# broker; the database is the only shared state. Live events (snapshots,
+# alerts, status changes) travel from workers back to the web process over a
+# multiprocessing queue and are fanned out to subscribers by the event hub.
+# Models are imported inside functions because this module is also imported
+# by freshly spawned workers before Django is set up.
+
+JOB_OPTIONS = ('batch_size', 'motion_gate', 'adaptive_stride', 'video_output', 'timing_report', 'use_cache')
+PROGRESS_INTERVAL = 1.0  # seconds between progress writes / cancel checks
+
+_executor = None
+_executor_lock = threading.RLock()
+_futures = {}
+_event_queue = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _worker_init(event_queue):
+    global _event_queue
+    _event_queue = event_queue
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'drone_threat.settings')
+    django.setup()
+    # A forked worker must not reuse the parent's database connection
+    connections.close_all()
+
+
+class ProgressReporter:
+    # Progress callback handed to detect_objects. Writes are throttled, and
+    # each write also picks up a cancellation request for the job.
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.last_report = 0
+
+    def __call__(self, frames_done, total_frames):
+        from ..models import AnalysisJob
+
+        now = time.monotonic()
+        if now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+
+        progress = min(frames_done / total_frames, 1.0) if total_frames > 0 else 0
+        _publish_metrics()
+        AnalysisJob.objects.filter(pk=self.job_id).update(progress=progress, updated_at=timezone.now())
+        _publish(self.job_id, "progress", {"progress": progress, "frames_done": frames_done,
+                                           "total_frames": total_frames})
+        if AnalysisJob.objects.filter(pk=self.job_id, cancel_requested=True).exists():
+            raise JobCancelled()
+
+
+def _publish(job_id, event, data):
+    _event_queue.put((str(job_id), event, data))
+
+
+def _publish_metrics():
+    # This worker's metrics, folded into the web process's /api/metrics
+    _event_queue.put((f"worker-{os.getpid()}", "metrics", registry.state()))
+
+
+def _publish_status(job):
+    status = job.as_dict()
+    # Clients stop listening once no further attempt will follow
+    status["final"] = job.status in (job.SUCCEEDED, job.CANCELLED) or (
+        job.status == job.FAILED and job.attempts >= job.max_attempts)
+    _publish(job.pk, "status", status)
+
+
+def run_job(job_id):
+    # Runs inside a worker process.
+    from ..models import AnalysisJob
+    from .result_cache import detect_objects_cached
+    from .uploads import pre_processed_path, post_processed_path
+
+    # Claim the job atomically so it only ever runs once per attempt
+    claimed = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.QUEUED, cancel_requested=False).update(
+        status=AnalysisJob.RUNNING, attempts=F('attempts') + 1, progress=0, error='',
+        started_at=timezone.now(), finished_at=None,
+    )
+    if not claimed:
+        cancelled = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.QUEUED, cancel_requested=True).update(
+            status=AnalysisJob.CANCELLED, finished_at=timezone.now(),
+        )
+        if cancelled:
+            _publish_status(AnalysisJob.objects.get(pk=job_id))
+        return
+
+    job = AnalysisJob.objects.get(pk=job_id)
+    _publish_status(job)
+    try:
+        result = detect_objects_cached(
+            pre_processed_path(job.file_name), post_processed_path(), job.file_name,
+            progress_callback=ProgressReporter(job_id),
+            on_snapshot=partial(_publish, job_id, "snapshot"),
+            on_alert=partial(_publish, job_id, "alert"),
+            on_zone_event=partial(_publish, job_id, "zone"),
+            **job.options
+        )
+    except JobCancelled:
+        AnalysisJob.objects.filter(pk=job_id).update(status=AnalysisJob.CANCELLED, finished_at=timezone.now())
+    except Exception:
+        AnalysisJob.objects.filter(pk=job_id).update(
+            status=AnalysisJob.FAILED, error=traceback.format_exc(), finished_at=timezone.now(),
+        )
+    else:
+        AnalysisJob.objects.filter(pk=job_id).update(
+            status=AnalysisJob.SUCCEEDED, progress=1.0, result=result, finished_at=timezone.now(),
+        )
+    _publish_metrics()
+    _publish_status(AnalysisJob.objects.get(pk=job_id))
+
+
+def get_executor():
+    global _executor, _event_queue
+    with _executor_lock:
+        if _executor is None:
+            mp_context = multiprocessing.get_context(settings.JOB_START_METHOD)
+            if _event_queue is None:
+                _event_queue = mp_context.Queue()
+                threading.Thread(target=_pump_events, name="job-events", daemon=True).start()
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.JOB_WORKERS, mp_context=mp_context,
+                initializer=_worker_init, initargs=(_event_queue,),
+            )
+            _recover_jobs()
+        return _executor
+
+
+def _pump_events():
+    while True:
+        channel, event, data = _event_queue.get()
+        if event == "metrics":
+            registry.merge_remote(channel, data)
+        else:
+            hub.publish(channel, event, data)
+
+
+def _recover_jobs():
+    # Jobs left behind by a previous server process are queued again. This
+    # assumes one process owns the pool, as with runserver or a single
+    # ASGI/WSGI worker.
+    from ..models import AnalysisJob
+
+    AnalysisJob.objects.filter(status=AnalysisJob.RUNNING).update(status=AnalysisJob.QUEUED)
+    for job_id in AnalysisJob.objects.filter(status=AnalysisJob.QUEUED).values_list('pk', flat=True):
+        if job_id not in _futures:
+            _dispatch(job_id)
+
+
+def _dispatch(job_id):
+    executor = get_executor()
+    future = executor.submit(run_job, job_id)
+    _futures[job_id] = future
+    future.add_done_callback(partial(_on_done, job_id, executor))
+
+
+def _reset_executor(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+
+
+def _on_done(job_id, executor, future):
+    from ..models import AnalysisJob
+
+    _futures.pop(job_id, None)
+    if future.cancelled():
+        return
+
+    exc = future.exception()
+    if isinstance(exc, BrokenProcessPool):
+        # A worker died (e.g. killed by the OOM killer); every job on the
+        # pool fails with this, so the pool is rebuilt on next dispatch.
+        _reset_executor(executor)
+    if exc is not None:
+        crashed = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.RUNNING).update(
+            status=AnalysisJob.FAILED, error=f"Worker error: {exc!r}", finished_at=timezone.now(),
+        )
+    else:
+        crashed = False
+
+    job = AnalysisJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return
+    if crashed:
+        # The worker could not report this itself
+        status = job.as_dict()
+        status["final"] = job.cancel_requested or job.attempts >= job.max_attempts
+        hub.publish(str(job_id), "status", status)
+    if job.cancel_requested:
+        return
+    if job.status == AnalysisJob.FAILED and job.attempts < job.max_attempts:
+        AnalysisJob.objects.filter(pk=job_id).update(status=AnalysisJob.QUEUED)
+        _dispatch(job_id)
+    elif job.status == AnalysisJob.QUEUED:
+        # Never started because the pool broke underneath it
+        _dispatch(job_id)
+
+
+def submit_job(file_name, options=None, max_attempts=None):
+    from ..models import AnalysisJob
+
+    options = {key: value for key, value in (options or {}).items() if key in JOB_OPTIONS}
+    # Start the pool (and recover leftover jobs) before this job exists
+    get_executor()
+    job = AnalysisJob.objects.create(
+        file_name=file_name, options=options,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    _dispatch(job.pk)
+    return job
+
+
+def cancel_job(job):
+    from ..models import AnalysisJob
+
+    if job.is_finished:
+        return job
+
+    future = _futures.get(job.pk)
+    if job.status == AnalysisJob.QUEUED and future is not None and future.cancel():
+        AnalysisJob.objects.filter(pk=job.pk).update(
+            status=AnalysisJob.CANCELLED, cancel_requested=True, finished_at=timezone.now(),
+        )
+        job.refresh_from_db()
+        # No worker ever saw this job, so nothing else will tell its subscribers
+        hub.publish(str(job.pk), "status", dict(job.as_dict(), final=True))
+        return job
+
+    # A running worker notices this at its next progress report, a queued
+    # one before it claims the job; either way the worker publishes the end
+    AnalysisJob.objects.filter(pk=job.pk).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Constant-velocity model over (x, y, vx, vy) with position measurements.
+# Same parameters as the per-track filterpy filters this replaces.
+F = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=np.float64)
+H = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], dtype=np.float64)
+P0 = np.eye(4) * 1000
+R = np.eye(2) * 5
+Q = np.eye(4) * 0.01
+I4 = np.eye(4)
+
+
+class KalmanBank:
+    # All track states live in contiguous (N, 4) / (N, 4, 4) arrays and are
+    # stepped together with one vectorized update + predict per frame. Track
+    # IDs are mapped to slots; released slots are reused by new tracks and
+    # the arrays double in size when full.
+
+    def __init__(self, capacity=64):
+        self.x = np.zeros((capacity, 4))
+        self.P = np.zeros((capacity, 4, 4))
+        self.slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, track_id):
+        return track_id in self.slots
+
+    def slot(self, track_id):
+        slot = self.slots.get(track_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self.x[slot] = 0
+            self.P[slot] = P0
+            self.slots[track_id] = slot
+        return slot
+
+    def release(self, track_id):
+        slot = self.slots.pop(track_id, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def _grow(self):
+        capacity = len(self.x)
+        self.x = np.concatenate([self.x, np.zeros((capacity, 4))])
+        self.P = np.concatenate([self.P, np.zeros((capacity, 4, 4))])
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def state(self, track_id):
+        return self.x[self.slots[track_id]]
+
+    def predict(self, track_ids):
+        # Predict step only, for tracks with no measurement this frame, so
+        # their states advance exactly as after update_predict. Returns the
+        # (n, 4) predicted states.
+        idx = np.fromiter((self.slots[track_id] for track_id in track_ids), dtype=np.intp, count=len(track_ids))
+        x = self.x[idx] @ F.T
+        self.x[idx] = x
+        self.P[idx] = F @ self.P[idx] @ F.T + Q
+        return x
+
+    def update_predict(self, track_ids, measurements):
+        # Kalman update with the measured centroids followed by a predict
+        # step, for every given track at once. Returns the (n, 4) states.
+        idx = np.fromiter((self.slot(track_id) for track_id in track_ids), dtype=np.intp, count=len(track_ids))
+        x = self.x[idx]
+        P = self.P[idx]
+        z = np.asarray(measurements, dtype=np.float64).reshape(-1, 2)
+
+        # Update (Joseph form, as filterpy does)
+        y = z - x @ H.T
+        PHT = P @ H.T
+        S = H @ PHT + R
+        K = PHT @ np.linalg.inv(S)
+        x = x + (K @ y[:, :, None])[:, :, 0]
+        I_KH = I4 - K @ H
+        P = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ R @ K.transpose(0, 2, 1)
+
+        # Predict
+        x = x @ F.T
+        P = F @ P @ F.T + Q
+
+        self.x[idx] = x
+        self.P[idx] = P
+        return x
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import TrajectoryAnalysisCache
+from .metrics import LLM_CACHE_EVENTS
+
+# Persistent cache of parsed trajectory analyses. Entries are keyed by a hash
+# of the normalized trajectory data together with the model name and prompt
+# version, so changing either one never serves a stale analysis. Entries
+# expire after LLM_CACHE_TTL seconds, and beyond LLM_CACHE_MAX_ENTRIES the
+# least recently used ones are evicted.
+
+FLOAT_DIGITS = 6  # floats are rounded so repr noise does not change the key
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+    LLM_CACHE_EVENTS.inc(amount, event=name)
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats["entries"] = TrajectoryAnalysisCache.objects.count()
+    return stats
+
+
+def _normalize(value):
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def canonical_json(trajectory):
+    # The same trajectory serialized with different whitespace, key order or
+    # float formatting maps to the same text.
+    if isinstance(trajectory, (str, bytes)):
+        try:
+            trajectory = json.loads(trajectory)
+        except ValueError:
+            # Not JSON; only surrounding whitespace is ignored
+            return trajectory.strip() if isinstance(trajectory, str) else trajectory.decode().strip()
+    return json.dumps(_normalize(trajectory), sort_keys=True, separators=(",", ":"))
+
+
+def cache_key(trajectory, model_name, prompt_version):
+    digest = hashlib.sha256()
+    for part in (model_name, prompt_version, canonical_json(trajectory)):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_cached(key):
+    entry = TrajectoryAnalysisCache.objects.filter(key=key).first()
+    now = timezone.now()
+    if entry is not None and entry.created_at < now - timedelta(seconds=settings.LLM_CACHE_TTL):
+        entry.delete()
+        _count("evictions")
+        entry = None
+    if entry is None:
+        _count("misses")
+        return None
+
+    TrajectoryAnalysisCache.objects.filter(key=key).update(hits=F('hits') + 1, last_used_at=now)
+    _count("hits")
+    return entry.result
+
+
+def put_cached(key, model_name, prompt_version, result):
+    now = timezone.now()
+    TrajectoryAnalysisCache.objects.update_or_create(
+        key=key,
+        defaults={"model_name": model_name, "prompt_version": prompt_version, "result": result,
+                  "hits": 0, "created_at": now, "last_used_at": now},
+    )
+    evict()
+
+
+def evict():
+    expired_before = timezone.now() - timedelta(seconds=settings.LLM_CACHE_TTL)
+    evicted, _ = TrajectoryAnalysisCache.objects.filter(created_at__lt=expired_before).delete()
+
+    stale_keys = list(
+        TrajectoryAnalysisCache.objects.order_by('-last_used_at')
+        .values_list('key', flat=True)[settings.LLM_CACHE_MAX_ENTRIES:]
+    )
+    if stale_keys:
+        removed, _ = TrajectoryAnalysisCache.objects.filter(key__in=stale_keys).delete()
+        evicted += removed
+    if evicted:
+        _count("evictions", evicted)
+    return evicted
+
+
+def clear_cache():
+    TrajectoryAnalysisCache.objects.all().delete()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
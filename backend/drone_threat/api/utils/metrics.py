@@ -0,0 +1,258 @@
+import bisect
+import math
+import threading
+import time
+
+# In-process metrics in the Prometheus text exposition format, served by
+# GET /api/metrics. Counters, gauges and histograms are cheap enough for the
+# per-frame hot path: an update is one lock and a dict lookup, plus a bisect
+# for histograms.
+#
+# Job workers are separate processes with their own registry. They send
+# their state to the web process with the job events (see jobs.py); the web
+# process keeps the latest state of each worker and adds it to its own when
+# rendering, so counters and histograms cover every process and gauges sum
+# across them.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def state(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+    def merge(self, into, state):
+        for key, value in state.items():
+            into[key] = into.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield self.name, self._labels(key), value
+
+    def _labels(self, key, **extra):
+        pairs = list(zip(self.labelnames, key)) + list(extra.items())
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}" if pairs else ""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [per-bucket counts (last is +Inf), sum, count]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def merge(self, into, state):
+        for key, (counts, total, count) in state.items():
+            entry = into.setdefault(key, [[0] * len(counts), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+
+    def samples(self, values):
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", self._labels(key, le=_format(bound)), cumulative
+            yield f"{self.name}_sum", self._labels(key), total
+            yield f"{self.name}_count", self._labels(key), count
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.remote = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def state(self):
+        return {name: metric.state() for name, metric in self.metrics.items()}
+
+    def merge_remote(self, source, state):
+        # Latest full state of another process (a job worker)
+        with self._lock:
+            self.remote[source] = state
+
+    def forget_remote(self, source):
+        with self._lock:
+            self.remote.pop(source, None)
+
+    def render(self):
+        with self._lock:
+            remote = list(self.remote.values())
+        lines = []
+        for name, metric in self.metrics.items():
+            values = {}
+            metric.merge(values, metric.state())
+            for state in remote:
+                metric.merge(values, state.get(name, {}))
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample, labels, value in metric.samples(values):
+                lines.append(f"{sample}{labels} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+FRAMES = registry.counter("drone_frames_total", "Source frames processed")
+FRAMES_INFERRED = registry.counter("drone_frames_inferred_total", "Frames run through the detector")
+RUNS = registry.counter("drone_runs_total", "detect_objects runs by outcome", ("outcome",))
+STAGE_SECONDS = registry.histogram("drone_stage_seconds", "Time per call of each hot-path stage", ("stage",))
+FRAMES_PER_SECOND = registry.gauge("drone_frames_per_second", "Throughput of the runs in progress")
+ACTIVE_RUNS = registry.gauge("drone_active_runs", "detect_objects runs in progress")
+ACTIVE_TRACKS = registry.gauge("drone_active_tracks", "Drones tracked in the latest frame of each run")
+QUEUE_DEPTH = registry.gauge("drone_pipeline_queue_depth", "Batches waiting in front of each pipeline stage",
+                             ("stage",))
+LLM_SECONDS = registry.histogram("drone_llm_request_seconds", "Latency of LLM analysis calls, retries included",
+                                 ("outcome",))
+LLM_CACHE_EVENTS = registry.counter("drone_llm_cache_events_total", "LLM result cache hits, misses and evictions",
+                                    ("event",))
+TRACK_VERDICTS = registry.counter("drone_track_verdicts_total", "Per-track classifications by source",
+                                  ("source",))
+
+
+class _StageTimer:
+    __slots__ = ("timings", "stage", "start")
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.stage, time.perf_counter() - self.start)
+
+
+class RunTimings:
+    # Stage timings of one run. Every measurement goes to STAGE_SECONDS and
+    # to per-run totals for the breakdown. Gauges set through set_share() are
+    # this run's contribution to a process-wide total, so concurrent runs add
+    # up instead of overwriting each other; close() withdraws them.
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.totals = {}
+        self.calls = {}
+        self._shares = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def add(self, stage, seconds):
+        # Each stage is timed from a single thread at a time
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def set_share(self, gauge, value, **labels):
+        key = (gauge.name, tuple(sorted(labels.items())))
+        with self._lock:
+            previous = self._shares.get(key, (gauge, labels, 0))[2]
+            self._shares[key] = (gauge, labels, value)
+        gauge.inc(value - previous, **labels)
+
+    def close(self):
+        with self._lock:
+            shares, self._shares = self._shares, {}
+        for gauge, labels, value in shares.values():
+            gauge.inc(-value, **labels)
+
+    def breakdown(self, frames):
+        # Stages run on different threads at the same time, so their shares
+        # of wall time can add up to more than 1.
+        wall = time.perf_counter() - self.start
+        return {
+            "wall_seconds": wall,
+            "frames": frames,
+            "fps": frames / wall if wall > 0 else 0.0,
+            "stages": {
+                stage: {
+                    "seconds": seconds,
+                    "calls": self.calls[stage],
+                    "ms_per_call": seconds / self.calls[stage] * 1000,
+                    "ms_per_frame": seconds / frames * 1000 if frames else 0.0,
+                    "share_of_wall": seconds / wall if wall > 0 else 0.0,
+                }
+                for stage, seconds in sorted(self.totals.items(), key=lambda item: -item[1])
+            },
+        }
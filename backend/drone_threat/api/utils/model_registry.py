@@ -0,0 +1,141 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+from ultralytics import YOLO
+
+from .onnx_backend import OnnxRuntimeModel
+
+# Models are loaded once per worker process and shared by every request in it.
+# Entries are keyed by (backend, weights, device, precision) so the same
+# weights can be served on different devices or backends side by side.
+#
+# A backend is a callable taking (weights, device, precision, threads) that
+# returns a model with predict() (returning ultralytics Results) and warm_up():
+# "ultralytics" runs the PyTorch weights, "onnxruntime" an exported ONNX
+# model on the CPU, in fp32 or INT8 (see onnx_backend.py and the
+# export_onnx command).
+_models = {}
+_registry_lock = threading.Lock()
+
+
+class LoadedModel:
+    def __init__(self, weights, device, precision, threads=None):
+        self.weights = weights
+        self.device = device
+        self.precision = precision
+        self.model = YOLO(weights)
+        # threads is unused: torch's thread count is process-wide and is set
+        # at process start (ApiConfig.ready, process_archive's worker_init)
+        # Ultralytics predictors keep per-call state, so a model must not run
+        # two inferences at once.
+        self.lock = threading.Lock()
+
+    @property
+    def key(self):
+        return ("ultralytics", self.weights, self.device, self.precision)
+
+    def predict_kwargs(self):
+        # Detections feed the tracker, which wants the same low-confidence
+        # input model.track() gives it (predict() alone would cut at 0.25)
+        kwargs = {"verbose": False, "conf": settings.TRACKER_CONF}
+        if self.precision == "fp16":
+            kwargs["half"] = True
+        if self.device is not None:
+            kwargs["device"] = self.device
+        return kwargs
+
+    def predict(self, source, **kwargs):
+        with self.lock:
+            return self.model.predict(source, **{**self.predict_kwargs(), **kwargs})
+
+    def warm_up(self, imgsz=640):
+        self.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8))
+
+
+def _onnx_model(weights, device, precision, threads=None):
+    return OnnxRuntimeModel(weights, device, precision, threads=threads or settings.INFERENCE_THREADS)
+
+
+BACKENDS = {
+    "ultralytics": LoadedModel,
+    "onnxruntime": _onnx_model,
+}
+PRECISIONS = {
+    "ultralytics": ("fp32", "fp16"),
+    "onnxruntime": ("fp32", "int8"),
+}
+
+
+def _normalize_key(weights=None, device=None, precision=None, backend=None):
+    backend = (backend or settings.INFERENCE_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported inference backend: {backend}")
+    if backend == "onnxruntime":
+        weights = str(weights or settings.ONNX_WEIGHTS)
+        device = "cpu"
+        precision = (precision or settings.ONNX_PRECISION).lower()
+    else:
+        weights = str(weights or settings.YOLO_WEIGHTS)
+        if device is None:
+            device = settings.YOLO_DEVICE
+        precision = (precision or settings.YOLO_PRECISION).lower()
+    if precision not in PRECISIONS[backend]:
+        raise ValueError(f"Unsupported model precision for {backend}: {precision}")
+    return backend, weights, device, precision
+
+
+def default_key():
+    # (backend, weights, device, precision) of the configured default model
+    return _normalize_key()
+
+
+def get_model(weights=None, device=None, precision=None, backend=None, threads=None):
+    # threads (default: settings.INFERENCE_THREADS) sizes an ONNX session
+    # when this call loads one; it is not part of the key
+    key = _normalize_key(weights, device, precision, backend)
+    entry = _models.get(key)
+    if entry is not None:
+        return entry
+
+    with _registry_lock:
+        entry = _models.get(key)
+        if entry is None:
+            entry = BACKENDS[key[0]](*key[1:], threads=threads)
+            _models[key] = entry
+        return entry
+
+
+def evict_model(weights=None, device=None, precision=None, backend=None):
+    key = _normalize_key(weights, device, precision, backend)
+    with _registry_lock:
+        return _models.pop(key, None) is not None
+
+
+def evict_all():
+    with _registry_lock:
+        count = len(_models)
+        _models.clear()
+    return count
+
+
+def reload_model(weights=None, device=None, precision=None, backend=None):
+    evict_model(weights, device, precision, backend)
+    return get_model(weights, device, precision, backend)
+
+
+def loaded_models():
+    return [entry.key for entry in list(_models.values())]
+
+
+def warm_up_models(specs=None):
+    # specs is a list of dicts with optional weights/device/precision/backend
+    # keys; the configured default model is used when none are given.
+    for spec in specs or [{}]:
+        get_model(**spec).warm_up()
+
+
+def warm_up_on_start():
+    # Called by the server entry points (wsgi.py, asgi.py)
+    if settings.YOLO_WARMUP:
+        warm_up_models()
@@ -1,76 +1,26 @@
+import copy
 import os
-from ultralytics import YOLO
-from filterpy.kalman import KalmanFilter
-from ultralytics import YOLO
+import shutil
 import cv2
-import numpy as np
-from collections import defaultdict, deque
 import json
 import time
-
-def detect_objects(video_url, output_dir, output_filename):
-    # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Prepare full output path
-    full_output_path = os.path.join(output_dir, output_filename+".mp4")
-    
-    try:
-        # Load YOLO model
-        model = YOLO("yolov8n.pt")
-        
-        # Open input video
-        cap = cv2.VideoCapture(video_url)
-        if not cap.isOpened():
-            return {
-                'success': False,
-                'output_path': None,
-                'error': f"Could not open video file: {video_url}"
-            }
-
-        # Get video properties
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-
-        # Initialize VideoWriter (MP4 format)
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(full_output_path, fourcc, fps, (frame_width, frame_height))
-
-        # Process frames
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            results = model(frame)
-            rendered_frame = results[0].plot()
-            out.write(rendered_frame)
-
-        # Release resources
-        cap.release()
-        out.release()
-        
-        # Verify output was created
-        if not os.path.exists(full_output_path):
-            return {
-                'success': False,
-                'output_path': None,
-                'error': "Output file was not created"
-            }
-
-        return {
-            'success': True,
-            'output_path': full_output_path,
-            'error': None
-        }
-
-    except Exception as e:
-        return {
-            'success': False,
-            'output_path': None,
-            'error': str(e)
-        }
+import numpy as np
+from django.conf import settings
+
+from .annotate import draw_detections, draw_trajectories
+from .frame_source import FrameSource
+from . import metrics
+from .model_registry import get_model
+from .motion_gate import MotionGate
+from .pipeline import Pipeline
+from .render_log import RenderLogWriter, render_log_path
+from .resolution import ResolutionAdapter
+from .stride import StrideScheduler
+from .tracking import ThreatTracker, build_snapshot
+from .trajectory_log import TrajectoryLogReader, TrajectoryLogWriter, export_json, log_path
+
+JSON_INTERVAL = 0.5
+VIDEO_OUTPUTS = ("encode", "deferred", "none")
 
 class NumpyEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -82,197 +32,243 @@ class NumpyEncoder(json.JSONEncoder):
             return obj.tolist()
         return super(NumpyEncoder, self).default(obj)
 
-def initialize_kalman():
-    kf = KalmanFilter(dim_x=4, dim_z=2)
-    kf.F = np.array([[1, 0, 1, 0],
-                     [0, 1, 0, 1],
-                     [0, 0, 1, 0],
-                     [0, 0, 0, 1]])
-    kf.H = np.array([[1, 0, 0, 0],
-                     [0, 1, 0, 0]])
-    kf.P *= 1000.
-    kf.R = np.eye(2) * 5
-    kf.Q = np.eye(4) * 0.1
-    return kf
-
-from filterpy.kalman import KalmanFilter
-from ultralytics import YOLO
-import cv2
-import numpy as np
-from collections import defaultdict, deque
-import json
-import time
-
-def initialize_kalman():
-    kf = KalmanFilter(dim_x=4, dim_z=2)
-    kf.F = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]])
-    kf.H = np.array([[1, 0, 0, 0], [0, 1, 0, 0]])
-    kf.P *= 1000
-    kf.R *= 5
-    kf.Q *= 0.01
-    kf.x = np.zeros((4, 1))
-    return kf
-
-def detect_objects(video_url, output_dir, output_filename):
-
-    model = YOLO("yolov8n.pt")
+def read_frames(cap, count):
+    frames, timestamps = [], []
+    while len(frames) < count and cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+        timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+    return frames, timestamps
+
+def detect_objects(video_url, output_dir, output_filename, batch_size=None, progress_callback=None,
+                   on_snapshot=None, on_alert=None, motion_gate=None, adaptive_stride=None, on_zone_event=None,
+                   video_output=None, timing_report=False):
+    # video_output: "encode" writes the annotated MP4 during the run,
+    # "deferred" only records what would be drawn so render_video() can
+    # produce the MP4 later on request, and "none" skips video entirely.
+    # timing_report adds a per-stage timing breakdown to the result and
+    # writes it next to the other outputs as <name>_timings.json.
+    batch_size = batch_size or settings.DETECTION_BATCH_SIZE
+    video_output = video_output or settings.VIDEO_OUTPUT
+    if video_output not in VIDEO_OUTPUTS:
+        raise ValueError(f"video_output must be one of {', '.join(VIDEO_OUTPUTS)}, not {video_output!r}")
+    encode_video = video_output == "encode"
+    if motion_gate is None:
+        motion_gate = settings.MOTION_GATE_ENABLED
+    if adaptive_stride is None:
+        adaptive_stride = settings.STRIDE_SCHEDULER_ENABLED
+    gate = MotionGate() if motion_gate else None
+    scheduler = StrideScheduler() if adaptive_stride else None
+
+    model = ResolutionAdapter(get_model())
     cap = cv2.VideoCapture(video_url)
 
     fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_time = 1 / fps
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
     output_path = f"{output_dir}/{output_filename}.mp4"
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
-
-    trajectories = defaultdict(list)
-    kalman_filters = defaultdict(initialize_kalman)
-    previous_velocities = defaultdict(lambda: (0, 0))
-    speed_records = defaultdict(lambda: deque(maxlen=5))
-    trajectory_json_array = []
+    timings = metrics.RunTimings()
+    # Created inside the try below, so a failed setup still releases
+    # whatever was opened and withdraws this run from the gauges
+    out = threat_tracker = trajectory_log = render_log = frame_source = pipeline = None
     last_json_time = 0
-    JSON_INTERVAL = 0.5
-
-    DRONE_CLASS_ID = 4
-    NO_FLY_ZONES = [(200, 150, 400, 350)]
-    PIXEL_TO_METER = 0.02
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        current_time = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
-        results = model.track(frame, persist=True, verbose=False)
-        annotated_frame = frame.copy()
-
-        if results[0].boxes.id is not None:
-            boxes = results[0].boxes.xyxy.cpu().numpy()
-            track_ids = results[0].boxes.id.cpu().numpy()
-            classes = results[0].boxes.cls.cpu().numpy()
-            confidences = results[0].boxes.conf.cpu().numpy()
-
-            current_trajectories = {}
-
-            for box, track_id, cls, conf in zip(boxes, track_ids, classes, confidences):
-                if cls == DRONE_CLASS_ID:
-                    x1, y1, x2, y2 = map(int, box)
-                    centroid = np.array([[(x1 + x2) / 2], [(y1 + y2) / 2]], dtype=np.float32)
-
-                    kf = kalman_filters[track_id]
-                    kf.update(centroid)
-                    kf.predict()
-                    predicted_pos = (int(kf.x[0].item()), int(kf.x[1].item()))
-                    trajectories[track_id].append(predicted_pos)
-
-                    velocity_x, velocity_y = kf.x[2].item(), kf.x[3].item()
-                    prev_vx, prev_vy = previous_velocities[track_id]
-                    velocity_magnitude = np.sqrt(velocity_x ** 2 + velocity_y ** 2)
-                    velocity_magnitude = max(velocity_magnitude, 1e-5)
-                    
-                    speed_mps = velocity_magnitude * PIXEL_TO_METER / frame_time
-                    speed_kmph = speed_mps * 3.6
-                    
-                    speed_records[track_id].append(float(speed_kmph))
-                    avg_speed = float(np.mean(speed_records[track_id]))
-                    previous_velocities[track_id] = (velocity_x, velocity_y)
-
-                    is_malicious = False
-                    if avg_speed > 50:
-                        is_malicious = True
-
-                    for zone in NO_FLY_ZONES:
-                        x_min, y_min, x_max, y_max = zone
-                        if x_min <= predicted_pos[0] <= x_max and y_min <= predicted_pos[1] <= y_max:
-                            is_malicious = True
-                            break
-
-                    acceleration = np.sqrt((velocity_x - prev_vx) ** 2 + (velocity_y - prev_vy) ** 2)
-                    if acceleration > 20:
-                        is_malicious = True
-
-                    if len(trajectories[track_id]) > 5:
-                        x_vals = [p[0] for p in trajectories[track_id][-5:]]
-                        y_vals = [p[1] for p in trajectories[track_id][-5:]]
-                        if np.std(x_vals) > 30 or np.std(y_vals) > 30:
-                            is_malicious = True
-
-                    if len(trajectories[track_id]) > 10:
-                        x_vals = [p[0] for p in trajectories[track_id][-10:]]
-                        y_vals = [p[1] for p in trajectories[track_id][-10:]]
-                        if max(x_vals) - min(x_vals) < 10 and max(y_vals) - min(y_vals) < 10:
-                            is_malicious = True
-                    
-                    if len(trajectories[track_id]) > 15:
-                        x_vals = [p[0] for p in trajectories[track_id][-15:]]
-                        y_vals = [p[1] for p in trajectories[track_id][-15:]]
-
-                        centroid_x = sum(x_vals) / len(x_vals)
-                        centroid_y = sum(y_vals) / len(y_vals)
-                        distances = [np.sqrt((x - centroid_x)**2 + (y - centroid_y)**2) for x, y in zip(x_vals, y_vals)]
-                        avg_distance = np.mean(distances)
-
-                        if avg_distance < 20:
-                            is_malicious = True
-
-
-                    current_trajectories[track_id] = {
-                        "position": predicted_pos,
-                        "speed_kmph": float(avg_speed),
-                        "is_malicious": is_malicious,
-                        "confidence": float(conf),
-                        "timestamp": float(current_time)
-                    }
-
-                    box_color = (0, 0, 255) if is_malicious else (0, 100, 0)
-                    threat_text = "MALICIOUS DRONE - ALERT" if is_malicious else "Safe Drone"
-
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), box_color, 2)
-                    text = f"ID: {track_id} | Speed: {avg_speed:.1f} km/h | Conf: {conf:.2f}"
-                    cv2.putText(annotated_frame, text, (x1, y1 - 20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, box_color, 2)
-                    cv2.putText(annotated_frame, threat_text, (x1, y1 - 40),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, box_color, 2)
+    frames_done = 0
+
+    # Decode, inference, annotation and encoding each run on their own thread
+    # so that OpenCV I/O overlaps with the model. Detection runs on the whole
+    # batch at once; tracking and the threat rules are then applied frame by
+    # frame, in order, in the annotate stage.
+    def run_model(frames, indices, detections):
+        with timings.stage("inference"):
+            results = model.predict([frames[i] for i in indices])
+            for i, result in zip(indices, results):
+                detections[i] = result.boxes.cpu().numpy()
+        metrics.FRAMES_INFERRED.inc(len(indices))
+
+    def infer(batch):
+        frames, timestamps = batch
+        # Frames the motion gate skips get None and are coasted by the tracker
+        detections = [None] * len(frames)
+        keep = []
+        with timings.stage("gating"):
+            for i, frame in enumerate(frames):
+                if gate is None or gate.should_infer(frame):
+                    keep.append(i)
+        if keep:
+            run_model(frames, keep, detections)
+        return frames, timestamps, detections
+
+    # With the stride scheduler there is no separate inference stage: the
+    # stride depends on the threat state of the frames before, so frames are
+    # gated in the annotate stage, in order with the tracker, and which ones
+    # are inferred does not depend on batch size or thread timing. When a
+    # frame is due, the rest of its batch that would be due if the mode held
+    # is inferred with it; a mode change only wastes those detections.
+    def scheduled_detections(frames, i, ahead):
+        with timings.stage("gating"):
+            # The gate only sees frames the stride makes due
+            due = scheduler.should_infer() and (gate is None or gate.should_infer(frames[i]))
+            if due:
+                scheduler.mark_inferred()
+                planned = [] if i in ahead else [i] + plan_ahead(frames, i)
+        if not due:
+            return None
+        if planned:
+            run_model(frames, planned, ahead)
+        return ahead.pop(i)
+
+    def plan_ahead(frames, start):
+        # Frames after start the scheduler and gate would keep if the mode
+        # did not change, found on copies of both
+        scheduler_copy, gate_copy = copy.deepcopy(scheduler), copy.deepcopy(gate)
+        planned = []
+        for i in range(start + 1, len(frames)):
+            if scheduler_copy.should_infer() and (gate_copy is None or gate_copy.should_infer(frames[i])):
+                scheduler_copy.mark_inferred()
+                planned.append(i)
+        return planned
+
+    def annotate(batch):
+        nonlocal last_json_time
+        if scheduler is not None:
+            frames, timestamps = batch
+            ahead = {}
+        else:
+            frames, timestamps, detections = batch
+        for i, (frame, current_time) in enumerate(zip(frames, timestamps)):
+            if scheduler is not None:
+                frame_detections = scheduled_detections(frames, i, ahead)
+            else:
+                frame_detections = detections[i]
+            if frame_detections is None:
+                current_trajectories = threat_tracker.coast(current_time)
+            else:
+                current_trajectories = threat_tracker.update(frame_detections, frame, current_time)
+                if scheduler is not None:
+                    scheduler.observe(current_trajectories)
+            if encode_video:
+                with timings.stage("drawing"):
+                    draw_detections(frame, current_trajectories)
+
+            if on_alert is not None:
+                for alert in threat_tracker.new_alerts:
+                    on_alert(alert)
+            if on_zone_event is not None:
+                for zone_event in threat_tracker.zone_events:
+                    on_zone_event(zone_event)
 
             if current_time - last_json_time >= JSON_INTERVAL and current_trajectories:
-                trajectory_snapshot = {
-    "timestamp": float(current_time),
-    "drones": [
-        {
-            "track_id": int(track_id),
-            "x": int(data["position"][0]),  # Ensure int
-            "y": int(data["position"][1]),  # Ensure int
-            "speed_kmph": float(data["speed_kmph"]),  # Ensure float
-            "is_malicious": bool(data["is_malicious"]),  # Ensure boolean
-            "confidence": float(data["confidence"])  # Ensure float
-        }
-        for track_id, data in current_trajectories.items()
-    ]
-}
-
-                trajectory_json_array.append(trajectory_snapshot)
-                last_json_time = current_time
-                print(json.dumps(trajectory_snapshot, indent=2))
-
-        for track_id, points in trajectories.items():
-            if len(points) > 1:
-                for i in range(1, len(points)):
-                    cv2.line(annotated_frame, points[i-1], points[i], (0, 255, 255), 2)
-                cv2.circle(annotated_frame, points[-1], 5, (255, 0, 0), -1)
-
-        out.write(annotated_frame)
-
-    cap.release()
-    out.release()
-
-    with open("trajectory_data.json", "w") as f:
-        json.dump(trajectory_json_array, f, indent=2)
+                with timings.stage("json"):
+                    trajectory_snapshot = build_snapshot(current_time, current_trajectories)
+                    trajectory_log.append_snapshot(trajectory_snapshot)
+                    last_json_time = current_time
+                    if settings.PRINT_SNAPSHOTS:
+                        print(json.dumps(trajectory_snapshot, indent=2))
+                    if on_snapshot is not None:
+                        on_snapshot(trajectory_snapshot)
+
+            if encode_video:
+                with timings.stage("drawing"):
+                    draw_trajectories(frame, threat_tracker.trajectories)
+            elif render_log is not None:
+                with timings.stage("render_log"):
+                    render_log.append_frame(current_trajectories, threat_tracker.evicted)
+        timings.set_share(metrics.ACTIVE_TRACKS, len(threat_tracker.active))
+
+        if encode_video:
+            return frames
+        for frame in frames:
+            frame_source.release(frame)
+        report_progress(len(frames))
+
+    def encode(annotated_frames):
+        for annotated_frame in annotated_frames:
+            with timings.stage("encoding"):
+                out.write(annotated_frame)
+            frame_source.release(annotated_frame)
+        report_progress(len(annotated_frames))
+
+    def report_progress(frames):
+        nonlocal frames_done
+        frames_done += frames
+        metrics.FRAMES.inc(frames)
+        timings.set_share(metrics.FRAMES_PER_SECOND, frames_done / (time.perf_counter() - timings.start))
+        for stage, depth in pipeline.queue_depths().items():
+            timings.set_share(metrics.QUEUE_DEPTH, depth, stage=stage)
+        if progress_callback is not None:
+            progress_callback(frames_done, total_frames)
+
+    try:
+        timings.set_share(metrics.ACTIVE_RUNS, 1)
+        # Outputs of an earlier run under this name go, including any this run
+        # does not write: a deferred render would otherwise find an older
+        # clip's video, or another mode a stale render log. Replacing rather
+        # than overwriting also matters for files hard linked into the cache.
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if video_output != "deferred":
+            shutil.rmtree(render_log_path(output_dir, output_filename), ignore_errors=True)
+        if encode_video:
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+        threat_tracker = ThreatTracker(fps, timings=timings)
+        trajectory_log = TrajectoryLogWriter(log_path(output_dir, output_filename), fps=fps)
+        if video_output == "deferred":
+            render_log = RenderLogWriter(render_log_path(output_dir, output_filename), fps,
+                                         (frame_width, frame_height), settings.TRAJECTORY_HISTORY)
+
+        # Enough buffers for a batch in each stage plus one being decoded
+        frame_source = FrameSource(cap, pool_size=max(settings.FRAME_POOL_SIZE, 4 * batch_size), timings=timings)
+        pipeline = Pipeline(maxsize=settings.PIPELINE_QUEUE_SIZE)
+        if scheduler is None:
+            pipeline.add_stage("infer", infer)
+        pipeline.add_stage("annotate", annotate)
+        if encode_video:
+            pipeline.add_stage("encode", encode)
+        pipeline.run(frame_source.batches(batch_size, should_stop=pipeline.stopped))
+    except BaseException:
+        metrics.RUNS.inc(outcome="failed")
+        raise
+    finally:
+        timings.close()
+        if frame_source is not None:
+            frame_source.close()
+        cap.release()
+        if out is not None:
+            out.release()
+        if trajectory_log is not None:
+            trajectory_log.close()
+        if render_log is not None:
+            render_log.close()
+
+    # JSON export kept for existing consumers of the trajectory data
+    with timings.stage("export"):
+        reader = TrajectoryLogReader(trajectory_log.path)
+        json_path = export_json(reader, os.path.join(output_dir, f"{output_filename}_trajectory.json"))
+    metrics.RUNS.inc(outcome="succeeded")
+
+    timing_breakdown = None
+    if timing_report:
+        timing_breakdown = timings.breakdown(frames_done)
+        with open(os.path.join(output_dir, f"{output_filename}_timings.json"), "w") as f:
+            json.dump(timing_breakdown, f, indent=2)
 
     return {
-        "video_path": output_path,
-        "json_data": trajectory_json_array
+        "video_path": output_path if encode_video else None,
+        "video_output": video_output,
+        "render_log": render_log.path if render_log is not None else None,
+        "trajectory_log": trajectory_log.path,
+        "json_path": json_path,
+        "motion_gate": gate.stats() if gate is not None else None,
+        "adaptive_stride": scheduler.stats() if scheduler is not None else None,
+        "frame_source": frame_source.stats(),
+        "inference": model.stats(),
+        "timings": timing_breakdown,
+        "json_data": list(reader.snapshots())
     }
 
 # import os
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+from django.conf import settings
+
+
+class MotionGate:
+    # Cheap pre-filter run before inference. Each frame is shrunk to a small
+    # blurred grayscale image and compared with the last frame that was sent
+    # to the model; if too few pixels changed, inference is skipped and the
+    # tracker coasts on its Kalman predictions instead. Comparing against the
+    # last inferred frame (rather than the previous frame) means slow drift
+    # still adds up to a change, and max_skip bounds how long we can coast.
+
+    def __init__(self, width=None, pixel_threshold=None, min_change=None, max_skip=None):
+        self.width = width or settings.MOTION_GATE_WIDTH
+        self.pixel_threshold = pixel_threshold or settings.MOTION_GATE_PIXEL_THRESHOLD
+        self.min_change = settings.MOTION_GATE_MIN_CHANGE if min_change is None else min_change
+        self.max_skip = settings.MOTION_GATE_MAX_SKIP if max_skip is None else max_skip
+        self.reference = None
+        self.skipped_in_row = 0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def _thumbnail(self, frame):
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed_fraction(self, thumbnail):
+        diff = cv2.absdiff(thumbnail, self.reference)
+        return np.count_nonzero(diff > self.pixel_threshold) / diff.size
+
+    def should_infer(self, frame):
+        self.frames_seen += 1
+        thumbnail = self._thumbnail(frame)
+        if (self.reference is not None and self.skipped_in_row < self.max_skip
+                and self.changed_fraction(thumbnail) < self.min_change):
+            self.skipped_in_row += 1
+            self.frames_skipped += 1
+            return False
+
+        self.reference = thumbnail
+        self.skipped_in_row = 0
+        return True
+
+    def stats(self):
+        return {
+            "frames": self.frames_seen,
+            "skipped": self.frames_skipped,
+            "skip_ratio": self.frames_skipped / self.frames_seen if self.frames_seen else 0.0,
+        }
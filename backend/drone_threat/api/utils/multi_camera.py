@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from . import metrics
+from .model_registry import get_model
+from .models_util import JSON_INTERVAL
+from .resolution import ResolutionAdapter
+from .streaming import LatestFrameReader, latency_stats
+from .tracking import ThreatTracker, build_snapshot
+
+_POLL_INTERVAL = 0.1
+
+
+class Camera:
+    # Everything that belongs to one feed: its reader and its own tracker,
+    # Kalman bank and trajectories (inside ThreatTracker). Nothing here is
+    # shared with other cameras; only the detector is.
+
+    def __init__(self, camera_id, source, replay=False, on_frame=None, timings=None, latency_window=1000):
+        self.camera_id = camera_id
+        self.source = source
+        self.reader = LatestFrameReader(source, replay=replay, on_frame=on_frame)
+        self.threat_tracker = ThreatTracker(self.reader.fps, timings=timings)
+        self.last_frame_number = 0
+        self.last_json_time = 0
+        self.frames_processed = 0
+        self.latencies = deque(maxlen=latency_window)
+
+    def process(self, item, detections):
+        # Tracks one inferred frame; returns a snapshot when one is due
+        frame_number, frame, captured_at = item
+        current_time = frame_number / self.reader.fps
+        current_trajectories = self.threat_tracker.update(
+            detections, frame, current_time, elapsed_frames=frame_number - self.last_frame_number,
+        )
+        self.last_frame_number = frame_number
+        self.frames_processed += 1
+        latency = time.monotonic() - captured_at
+        self.latencies.append(latency)
+
+        if current_time - self.last_json_time < JSON_INTERVAL or not current_trajectories:
+            return None
+        self.last_json_time = current_time
+        trajectory_snapshot = build_snapshot(current_time, current_trajectories)
+        trajectory_snapshot["camera"] = self.camera_id
+        trajectory_snapshot["latency_ms"] = latency * 1000
+        return trajectory_snapshot
+
+    def stats(self):
+        return {
+            "source": str(self.source),
+            "frames_read": self.reader.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.reader.frames_dropped,
+            "latency_ms": latency_stats(self.latencies),
+        }
+
+
+class MultiCameraStream:
+    # Real-time detection over several live sources with one shared model.
+    # Iterating yields trajectory snapshots from every camera, tagged with
+    # "camera", as they are produced.
+    #
+    # Each inference call batches the newest frame of up to batch_size
+    # cameras, at most one frame per camera, so a busy or high frame rate
+    # feed cannot take more than its share of a batch. When there are more
+    # cameras with frames than fit in a batch, the next batch starts after
+    # the last camera served (round robin). A partial batch waits up to
+    # batch_wait seconds for other cameras' frames before it runs. Frames a
+    # camera produces while waiting for its turn replace each other in its
+    # reader and are counted as dropped, as in LiveDetectionStream.
+
+    def __init__(self, sources, replay=False, batch_size=None, batch_wait=None, on_snapshot=None, on_alert=None):
+        # sources maps camera IDs to stream URLs, camera indices or files
+        if not sources:
+            raise ValueError("No camera sources given")
+        self.sources = dict(sources)
+        self.replay = replay
+        self.batch_size = batch_size or settings.MULTI_CAMERA_BATCH_SIZE
+        self.batch_wait = settings.MULTI_CAMERA_BATCH_WAIT if batch_wait is None else batch_wait
+        self.on_snapshot = on_snapshot
+        self.on_alert = on_alert
+        self.cameras = []
+        self.batches = 0
+        self.frames_batched = 0
+        self._next = 0
+        self._wake = threading.Event()
+
+    def _collect(self, batch, limit):
+        # Adds the newest frame of cameras not yet in the batch, in round
+        # robin order from self._next
+        served = {camera.camera_id for camera, _ in batch}
+        count = len(self.cameras)
+        for offset in range(count):
+            if len(batch) >= limit:
+                break
+            index = (self._next + offset) % count
+            camera = self.cameras[index]
+            if camera.camera_id in served:
+                continue
+            item = camera.reader.poll()
+            if item is not None:
+                batch.append((camera, item))
+                self._next = (index + 1) % count
+
+    def _next_batch(self):
+        # Blocks until a batch is ready; None once every source is exhausted
+        batch = []
+        deadline = None
+        while True:
+            self._wake.clear()
+            active = [camera for camera in self.cameras if not camera.reader.finished]
+            if not active and not batch:
+                return None
+            limit = min(self.batch_size, len(active)) or len(batch)
+            self._collect(batch, limit)
+            if len(batch) >= limit:
+                return batch
+            now = time.monotonic()
+            if batch:
+                deadline = deadline or now + self.batch_wait
+                if now >= deadline:
+                    return batch
+            self._wake.wait(timeout=deadline - now if deadline else _POLL_INTERVAL)
+
+    def __iter__(self):
+        model = get_model()
+        # Keep one-off predictor setup out of the first frames' latency
+        model.warm_up()
+        model = ResolutionAdapter(model)
+        timings = metrics.RunTimings()
+        try:
+            for camera_id, source in self.sources.items():
+                self.cameras.append(Camera(camera_id, source, replay=self.replay, on_frame=self._wake.set,
+                                           timings=timings))
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                with timings.stage("inference"):
+                    results = model.predict([item[1] for _, item in batch])
+                self.batches += 1
+                self.frames_batched += len(batch)
+                metrics.FRAMES.inc(len(batch))
+                metrics.FRAMES_INFERRED.inc(len(batch))
+
+                for (camera, item), result in zip(batch, results):
+                    trajectory_snapshot = camera.process(item, result.boxes.cpu().numpy())
+                    if self.on_alert is not None:
+                        for alert in camera.threat_tracker.new_alerts:
+                            self.on_alert(camera.camera_id, alert)
+                    if trajectory_snapshot is not None:
+                        if self.on_snapshot is not None:
+                            self.on_snapshot(trajectory_snapshot)
+                        yield trajectory_snapshot
+        finally:
+            for camera in self.cameras:
+                camera.reader.close()
+            timings.close()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "mean_batch_size": self.frames_batched / self.batches if self.batches else 0.0,
+            "cameras": {camera.camera_id: camera.stats() for camera in self.cameras},
+        }
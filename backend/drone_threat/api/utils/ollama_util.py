@@ -1,22 +1,46 @@
+import json
 import ollama
 import re
+import time
+from django.conf import settings
 
-def analyze_drone_trajectory(trajectory_json):
-    prompt_template = f"""
-    You are an expert in drone trajectory analysis. Analyze the following drone trajectory data and classify the behavior.
+from .llm_cache import cache_key, get_cached, put_cached
+from .metrics import LLM_SECONDS
+from .trajectory_summary import summarize_trajectory
+
+# Bump whenever the prompt or the parsing changes, so cached analyses made
+# with the old prompt are not served.
+PROMPT_VERSION = "4"
 
-    ### Data Description:
+RAW_DATA_DESCRIPTION = """
     Each data entry consists of:
     - **X-Y Coordinates**: The position of the drone in space.
     - **Speed**: The velocity of the drone.
     - **Confidence**: The certainty of the data provided.
-    - **Malicious**: A preliminary classification (if available).
+    - **Malicious**: A preliminary classification (if available)."""
+
+SUMMARY_DATA_DESCRIPTION = """
+    The data summarizes each tracked drone (pixel coordinates, times in seconds):
+    - **path**: Simplified flight path as [x, y, time] points.
+    - **distance_m** / **straightness**: Distance flown, and displacement over distance (near 0 = circling or hovering).
+    - **speed_kmph** / **acceleration_kmph_per_s**: Speed and acceleration statistics.
+    - **dwell_seconds** / **loitering**: Time in view, and time (longest intervals) spent hovering in one spot.
+    - **no_fly_zone**: Entries into each no-fly zone, total seconds inside and the longest intervals (entered zones are listed in no_fly_zones with their bounding box [x_min, y_min, x_max, y_max]).
+    - **flagged_malicious_ratio**: Fraction of samples a preliminary rule check flagged as malicious.
+    - **mean_confidence**: Mean detection confidence."""
+
+def build_prompt(trajectory_json, summarized=False):
+    data_description = SUMMARY_DATA_DESCRIPTION if summarized else RAW_DATA_DESCRIPTION
+    return f"""
+    You are an expert in drone trajectory analysis. Analyze the following drone trajectory data and classify the behavior.
+
+    ### Data Description:{data_description}
 
     ### Task:
     1. **Analyze** the given data to determine if the drone is behaving maliciously.
     2. If **malicious**, classify the **Behavior** (e.g., "Suspicious Loitering", "Intrusion Detected").
        - Provide a **Confidence** score (in percentage) for the classification.
-       - Explain your **Reasoning** in detail.
+       - Explain your **Reasoning** briefly.
     3. If **not malicious**, classify the **Behavior** as "Normal Operation" or another suitable term.
        - Provide a **Confidence** score (in percentage).
        - Explain why it does **not** appear to be malicious.
@@ -30,21 +54,125 @@ def analyze_drone_trajectory(trajectory_json):
     - **Confidence**: The confidence level in percentage (0-100).
     - **Reasoning**: A brief explanation of the classification.
 
-    Format the response as:
-    Behaviour: <classification>
-    Confidence: <confidence percentage>
-    Reasoning: <explanation>
+    Format the response as a single JSON object:
+    {{"Behaviour": "<classification>", "Confidence": <0-100>, "Reasoning": "<explanation>"}}
     """
 
-    # Send the prompt to Ollama
-    response = ollama.chat(
-        model='qwen2.5-coder:1.5b',
-        messages=[{'role': 'user', 'content': prompt_template}]
-    )
+# Structured output: Ollama constrains generation to this schema, in this
+# field order, so Reasoning is always the last field produced.
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Behaviour": {"type": "string"},
+        "Confidence": {"type": "integer", "minimum": 0, "maximum": 100},
+        "Reasoning": {"type": "string"},
+    },
+    "required": ["Behaviour", "Confidence", "Reasoning"],
+}
+REQUIRED_FIELDS = tuple(RESPONSE_SCHEMA["required"])
+RETRY_MESSAGE = (
+    "That reply was not valid. Answer again with only the JSON object "
+    '{"Behaviour": string, "Confidence": integer 0-100, "Reasoning": string}.'
+)
+
+FIELD_PATTERN = re.compile(r'"(behaviou?r|confidence|reasoning)"\s*:\s*', re.IGNORECASE)
+FIELD_NAMES = {"behaviour": "Behaviour", "behavior": "Behaviour", "confidence": "Confidence", "reasoning": "Reasoning"}
+_decoder = json.JSONDecoder()
+
+
+class StreamingResultParser:
+    # Collects the fields of a (possibly partial, possibly sloppy) JSON answer
+    # as it streams in. A field counts once its value is fully received, so
+    # the caller can stop generation as soon as `complete` is true.
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+
+    @property
+    def complete(self):
+        return all(field in self.fields for field in REQUIRED_FIELDS)
+
+    def feed(self, chunk):
+        self.text += chunk
+        for match in FIELD_PATTERN.finditer(self.text):
+            field = FIELD_NAMES[match.group(1).lower()]
+            if field in self.fields:
+                continue
+            try:
+                value, end = _decoder.raw_decode(self.text, match.end())
+            except ValueError:
+                continue  # value not fully received yet
+            if not isinstance(value, str) and end == len(self.text):
+                continue  # a number may still have digits to come
+            self.fields[field] = value
+        return self.complete
 
-    # Extract model response
-    raw_output = response['message']['content'].strip()
+    def result(self):
+        # Validated result, or None when the answer is unusable. Answers in
+        # the old "Behaviour: ..." line format are still accepted.
+        fields = self.fields if self.complete else parse_response(self.text)
+        return validate_result(fields)
 
+
+def validate_result(fields):
+    behaviour = fields.get("Behaviour")
+    reasoning = fields.get("Reasoning")
+    confidence = fields.get("Confidence")
+    if isinstance(confidence, str):
+        confidence_match = re.search(r"\d+(\.\d+)?", confidence)
+        confidence = float(confidence_match.group()) if confidence_match else None
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+        return None
+    if not (isinstance(behaviour, str) and behaviour.strip() and isinstance(reasoning, str)):
+        return None
+    if not 0 <= confidence <= 100:
+        return None
+    return {"Behaviour": behaviour.strip(), "Confidence": int(round(confidence)), "Reasoning": reasoning.strip()}
+
+
+def chat_structured(client, model, prompt):
+    # Streams a schema-constrained answer and stops reading as soon as every
+    # field is in (closing the stream ends generation on the server). One
+    # retry on invalid output; returns None if that fails too.
+    messages = [{'role': 'user', 'content': prompt}]
+    for attempt in range(1 + settings.LLM_MAX_RETRIES):
+        parser = StreamingResultParser()
+        stream = client.chat(model=model, messages=messages, format=RESPONSE_SCHEMA, stream=True)
+        try:
+            for chunk in stream:
+                if parser.feed(chunk['message']['content']):
+                    break
+        finally:
+            stream.close()
+        result = parser.result()
+        if result is not None:
+            return result
+        messages = messages + [{'role': 'assistant', 'content': parser.text},
+                               {'role': 'user', 'content': RETRY_MESSAGE}]
+    return None
+
+
+async def achat_structured(client, model, prompt):
+    # chat_structured for ollama.AsyncClient
+    messages = [{'role': 'user', 'content': prompt}]
+    for attempt in range(1 + settings.LLM_MAX_RETRIES):
+        parser = StreamingResultParser()
+        stream = await client.chat(model=model, messages=messages, format=RESPONSE_SCHEMA, stream=True)
+        try:
+            async for chunk in stream:
+                if parser.feed(chunk['message']['content']):
+                    break
+        finally:
+            await stream.aclose()
+        result = parser.result()
+        if result is not None:
+            return result
+        messages = messages + [{'role': 'assistant', 'content': parser.text},
+                               {'role': 'user', 'content': RETRY_MESSAGE}]
+    return None
+
+def parse_response(raw_output):
     # Initialize the response dictionary
     result = {
         "Behaviour": "",
@@ -65,3 +193,37 @@ def analyze_drone_trajectory(trajectory_json):
 
     return result
 
+def prepare_prompt(trajectory_json, summarize=True):
+    # Long videos produce thousands of snapshots; by default each track is
+    # compressed into a handful of features before prompting.
+    if summarize:
+        summary = summarize_trajectory(trajectory_json)
+        return build_prompt(json.dumps(summary, separators=(",", ":")), summarized=True)
+    return build_prompt(trajectory_json)
+
+def analyze_drone_trajectory(trajectory_json, model=None, use_cache=True, summarize=True):
+    model = model or settings.OLLAMA_MODEL
+    prompt_version = PROMPT_VERSION if summarize else f"{PROMPT_VERSION}-raw"
+    key = cache_key(trajectory_json, model, prompt_version)
+    if use_cache:
+        cached = get_cached(key)
+        if cached is not None:
+            return cached
+
+    # Send the prompt to Ollama
+    client = ollama.Client(host=settings.OLLAMA_HOST)
+    start = time.perf_counter()
+    try:
+        result = chat_structured(client, model, prepare_prompt(trajectory_json, summarize))
+    except Exception:
+        LLM_SECONDS.observe(time.perf_counter() - start, outcome="error")
+        raise
+    LLM_SECONDS.observe(time.perf_counter() - start, outcome="ok" if result is not None else "invalid")
+
+    # Unusable answers are not cached so the next call tries again
+    if result is None:
+        return {"Behaviour": "", "Confidence": 0, "Reasoning": ""}
+    if use_cache:
+        put_cached(key, model, prompt_version, result)
+    return result
+
@@ -0,0 +1,155 @@
+import ast
+import os
+import re
+import threading
+
+import numpy as np
+import torch
+from django.conf import settings
+from ultralytics.data.augment import LetterBox
+from ultralytics.engine.results import Results
+from ultralytics.utils import nms, ops
+
+# YOLO detection on ONNX Runtime (CPU), for exported models (see the
+# export_onnx command). Pre- and post-processing mirror the ultralytics
+# predictor (letterbox, BGR->RGB, /255, NMS, box rescale) and predictions
+# come back as ultralytics Results, so callers cannot tell the backends
+# apart. onnxruntime is only imported when such a model is loaded.
+
+IOU_THRESHOLD = 0.7  # ultralytics predict defaults
+MAX_DETECTIONS = 300
+
+
+def int8_path(onnx_path):
+    root, ext = os.path.splitext(onnx_path)
+    return f"{root}.int8{ext}"
+
+
+def session_options(threads):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.inter_op_num_threads = 1
+    if threads:
+        options.intra_op_num_threads = threads
+    return options
+
+
+class OnnxRuntimeModel:
+    def __init__(self, weights, device, precision, threads=None):
+        import onnxruntime
+
+        self.weights = weights
+        self.device = device
+        self.precision = precision
+        path = int8_path(weights) if precision == "int8" else weights
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX model not found: {path} (create it with manage.py export_onnx)")
+        self.session = onnxruntime.InferenceSession(path, session_options(threads), providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # An input shape with named (symbolic) dimensions was exported with dynamic=True
+        self.dynamic = any(isinstance(dim, str) for dim in self.session.get_inputs()[0].shape)
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        self.stride = int(metadata.get("stride", 32))
+        imgsz = ast.literal_eval(metadata["imgsz"]) if "imgsz" in metadata else [640, 640]
+        self.imgsz = tuple(imgsz) if isinstance(imgsz, (list, tuple)) else (imgsz, imgsz)
+        self.lock = threading.Lock()
+
+    @property
+    def key(self):
+        return ("onnxruntime", self.weights, self.device, self.precision)
+
+    def preprocess(self, frames, imgsz=None):
+        # As in ultralytics: a dynamic model takes any imgsz, and is only
+        # padded to the minimum stride multiple when the batch has one shape
+        size = (imgsz, imgsz) if imgsz and self.dynamic else self.imgsz
+        same_shapes = len({frame.shape for frame in frames}) == 1
+        letterbox = LetterBox(size, auto=self.dynamic and same_shapes, stride=self.stride)
+        images = np.stack([letterbox(image=frame) for frame in frames])
+        images = images[..., ::-1].transpose(0, 3, 1, 2)  # BGR to RGB, BHWC to BCHW
+        return np.ascontiguousarray(images, dtype=np.float32) / 255
+
+    def postprocess(self, output, image_shape, frames):
+        # Same confidence floor as the PyTorch backend (see TRACKER_CONF)
+        predictions = nms.non_max_suppression(
+            torch.from_numpy(output), settings.TRACKER_CONF, IOU_THRESHOLD, max_det=MAX_DETECTIONS,
+        )
+        results = []
+        for prediction, frame in zip(predictions, frames):
+            prediction[:, :4] = ops.scale_boxes(image_shape, prediction[:, :4], frame.shape)
+            results.append(Results(frame, path="", names=self.names, boxes=prediction[:, :6]))
+        return results
+
+    def predict(self, source, imgsz=None, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        images = self.preprocess(frames, imgsz)
+        with self.lock:
+            output = self.session.run(None, {self.input_name: images})[0]
+        return self.postprocess(output, images.shape[2:], frames)
+
+    def warm_up(self, imgsz=640):
+        self.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8))
+
+
+class FrameCalibrationReader:
+    # Feeds letterboxed frames to onnxruntime's static quantization
+    # calibration, one frame per batch.
+
+    def __init__(self, frames, imgsz, stride=32):
+        self.letterbox = LetterBox((imgsz, imgsz), auto=False, stride=stride)
+        self.frames = iter(frames)
+
+    def get_next(self):
+        frame = next(self.frames, None)
+        if frame is None:
+            return None
+        image = self.letterbox(image=frame)[..., ::-1].transpose(2, 0, 1)
+        return {"images": np.ascontiguousarray(image[None], dtype=np.float32) / 255}
+
+
+def head_nodes(onnx_path):
+    # Box decoding nodes of the last module (the Detect head: DFL, anchors,
+    # concat), but not its convolutions. Quantizing the decoding costs a lot
+    # of box accuracy for no speed.
+    import onnx
+
+    graph = onnx.load(onnx_path).graph
+    modules = [re.match(r"/model\.(\d+)/", node.name) for node in graph.node]
+    last = max((int(match.group(1)) for match in modules if match), default=None)
+    if last is None:
+        return []
+    prefix = f"/model.{last}/"
+    convs = (f"{prefix}cv2", f"{prefix}cv3")
+    return [node.name for node in graph.node if node.name.startswith(prefix) and not node.name.startswith(convs)]
+
+
+def quantize_int8(onnx_path, calibration_frames, output_path=None, imgsz=640):
+    # Static QDQ quantization, with activation ranges calibrated on real
+    # frames. (Dynamic, weights-only quantization turns convolutions into
+    # ConvInteger, which runs slower than fp32 on ONNX Runtime CPU.)
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if not calibration_frames:
+        raise ValueError("INT8 quantization needs calibration frames")
+    output_path = output_path or int8_path(onnx_path)
+    # ONNX shape inference and graph optimization (constant folding) first,
+    # so every conv's weights and bias are initializers the quantizer can
+    # see. Symbolic shape inference cannot resolve the dynamic head.
+    prepared = f"{output_path}.prep.onnx"
+    try:
+        quant_pre_process(onnx_path, prepared, skip_symbolic_shape=True)
+        quantize_static(
+            prepared, output_path, FrameCalibrationReader(calibration_frames, imgsz),
+            quant_format=QuantFormat.QDQ, per_channel=True,
+            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+            nodes_to_exclude=head_nodes(prepared),
+        )
+    finally:
+        if os.path.exists(prepared):
+            os.remove(prepared)
+    return output_path
@@ -0,0 +1,103 @@
+import queue
+import threading
+
+_EOF = object()
+_POLL_INTERVAL = 0.1
+
+
+class Pipeline:
+    # Runs a source and a chain of stages on separate threads, linked by
+    # bounded queues. Each stage is a single thread consuming its queue in
+    # FIFO order, so items leave the pipeline in the order the source produced
+    # them. A full queue blocks the stage feeding it (backpressure). The first
+    # exception raised anywhere stops every stage and is re-raised by run().
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.stages = []
+        self.queues = []
+        self._stop = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+
+    def add_stage(self, name, fn):
+        self.stages.append((name, fn))
+        return self
+
+    def queue_depths(self):
+        return {name: q.qsize() for (name, _), q in zip(self.stages, self.queues)}
+
+    def run(self, source):
+        self.queues = [queue.Queue(maxsize=self.maxsize) for _ in self.stages]
+        threads = [threading.Thread(target=self._run_source, args=(source, self.queues[0]),
+                                    name="pipeline-source", daemon=True)]
+        for i, (name, fn) in enumerate(self.stages):
+            out_queue = self.queues[i + 1] if i + 1 < len(self.queues) else None
+            threads.append(threading.Thread(target=self._run_stage, args=(fn, self.queues[i], out_queue),
+                                            name=f"pipeline-{name}", daemon=True))
+
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            self._stop.set()
+            raise
+
+        if self._error is not None:
+            raise self._error
+
+    def stop(self):
+        self._stop.set()
+
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _fail(self, exc):
+        with self._error_lock:
+            if self._error is None:
+                self._error = exc
+        self._stop.set()
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _EOF
+
+    def _run_source(self, source, out_queue):
+        try:
+            for item in source:
+                if not self._put(out_queue, item):
+                    return
+        except BaseException as exc:
+            self._fail(exc)
+            return
+        self._put(out_queue, _EOF)
+
+    def _run_stage(self, fn, in_queue, out_queue):
+        try:
+            while True:
+                item = self._get(in_queue)
+                if item is _EOF:
+                    break
+                result = fn(item)
+                if out_queue is not None and not self._put(out_queue, result):
+                    return
+        except BaseException as exc:
+            self._fail(exc)
+            return
+        if out_queue is not None:
+            self._put(out_queue, _EOF)
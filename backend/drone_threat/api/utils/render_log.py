@@ -0,0 +1,201 @@
+import json
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from .annotate import draw_detections, draw_trajectories
+from .frame_source import FrameSource
+from .trajectory_buffer import TrajectoryBuffer
+
+# Per-frame record of everything the annotate stage draws, so an annotated
+# video can be rendered later from the source clip instead of being encoded
+# on every run. Same layout as the trajectory log (one raw column file per
+# field plus meta.json), but with a row per drone per source frame, and a
+# row flagged FLAG_EVICTED when a track's drawn trajectory is dropped.
+# Replaying the rows rebuilds the tracker's trajectories exactly, so the
+# rendered video matches the one detect_objects would have encoded.
+
+LOG_VERSION = 1
+COLUMNS = (
+    ("frame", "<i4"),
+    ("track_id", "<i4"),
+    ("x1", "<i4"),
+    ("y1", "<i4"),
+    ("x2", "<i4"),
+    ("y2", "<i4"),
+    ("x", "<i4"),
+    ("y", "<i4"),
+    ("speed_kmph", "<f8"),
+    ("confidence", "<f8"),
+    ("flags", "u1"),
+)
+FLAG_MALICIOUS = 1
+FLAG_EVICTED = 2
+FLUSH_ROWS = 1024
+
+
+def render_log_path(output_dir, output_filename):
+    return os.path.join(output_dir, f"{output_filename}.renderlog")
+
+
+class RenderLogWriter:
+    # Starts a new log at path, replacing (not truncating) any previous one.
+    # meta.json is rewritten on close with the frame count; a log without it
+    # is incomplete.
+
+    def __init__(self, path, fps, frame_size, history):
+        self.path = path
+        self.meta = {"version": LOG_VERSION, "columns": COLUMNS, "fps": fps,
+                     "frame_size": list(frame_size), "history": history, "frames": None}
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        self._write_meta()
+        self.files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name, _ in COLUMNS}
+        self.pending = {name: [] for name, _ in COLUMNS}
+        self.pending_rows = 0
+        self.frames = 0
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+
+    def append_frame(self, current_trajectories, evicted=()):
+        for track_id, data in current_trajectories.items():
+            x1, y1, x2, y2 = data["box"]
+            self._append(track_id, x1, y1, x2, y2, *data["position"], data["speed_kmph"], data["confidence"],
+                         FLAG_MALICIOUS if data["is_malicious"] else 0)
+        for track_id in evicted:
+            self._append(track_id, 0, 0, 0, 0, 0, 0, 0.0, 0.0, FLAG_EVICTED)
+        self.frames += 1
+        if self.pending_rows >= FLUSH_ROWS:
+            self.flush()
+
+    def _append(self, *row):
+        self.pending["frame"].append(self.frames)
+        for (name, _), value in zip(COLUMNS[1:], row):
+            self.pending[name].append(value)
+        self.pending_rows += 1
+
+    def flush(self):
+        if self.pending_rows:
+            for name, dtype in COLUMNS:
+                self.files[name].write(np.asarray(self.pending[name], dtype=dtype).tobytes())
+                self.pending[name].clear()
+            self.pending_rows = 0
+        for f in self.files.values():
+            f.flush()
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.meta["frames"] = self.frames
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RenderLogReader:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != LOG_VERSION:
+            raise ValueError(f"Unsupported render log version: {self.meta['version']}")
+        if self.meta["frames"] is None:
+            raise ValueError(f"Render log was not closed: {path}")
+
+        self.rows = min(
+            os.path.getsize(os.path.join(path, f"{name}.bin")) // np.dtype(dtype).itemsize
+            for name, dtype in COLUMNS
+        )
+        self.columns = {
+            name: np.fromfile(os.path.join(path, f"{name}.bin"), dtype=dtype, count=self.rows)
+            for name, dtype in COLUMNS
+        }
+        # Rows of frame n are frame_start[n]:frame_start[n + 1]
+        self.frame_start = np.searchsorted(self.columns["frame"], np.arange(self.meta["frames"] + 1))
+
+    def frame(self, n):
+        # (current_trajectories as drawn by annotate, evicted track IDs)
+        lo, hi = self.frame_start[n], self.frame_start[n + 1]
+        current_trajectories, evicted = {}, []
+        c = {name: column[lo:hi].tolist() for name, column in self.columns.items()}
+        for i in range(hi - lo):
+            # Float IDs, as the tracker hands them out (and as they are labelled)
+            track_id = float(c["track_id"][i])
+            if c["flags"][i] & FLAG_EVICTED:
+                evicted.append(track_id)
+                continue
+            current_trajectories[track_id] = {
+                "box": (c["x1"][i], c["y1"][i], c["x2"][i], c["y2"][i]),
+                "position": (c["x"][i], c["y"][i]),
+                "speed_kmph": c["speed_kmph"][i],
+                "confidence": c["confidence"][i],
+                "is_malicious": bool(c["flags"][i] & FLAG_MALICIOUS),
+            }
+        return current_trajectories, evicted
+
+
+def is_rendered(log_path, output_path):
+    # The video is current if it was written after the log was closed
+    meta_path = os.path.join(log_path, "meta.json")
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(meta_path)
+
+
+def ensure_rendered(video_url, log_path, output_path):
+    # Renders only when no current video exists. Rendering goes to a
+    # temporary file that replaces output_path at the end, so a reader never
+    # sees a half-written video and concurrent requests do not collide.
+    if is_rendered(log_path, output_path):
+        return {"video_path": output_path, "rendered": False}
+    fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(output_path) or ".")
+    os.close(fd)
+    try:
+        result = render_video(video_url, log_path, tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {"video_path": output_path, "rendered": True, "frames": result["frames"]}
+
+
+def render_video(video_url, log_path, output_path):
+    # Draws the logged detections onto the source clip, frame by frame
+    log = RenderLogReader(log_path)
+    cap = cv2.VideoCapture(video_url)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_url}")
+    width, height = log.meta["frame_size"]
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), log.meta["fps"], (width, height))
+    trajectories = defaultdict(lambda: TrajectoryBuffer(log.meta["history"]))
+    frames = 0
+    source = FrameSource(cap)
+    try:
+        for frame, _ in source.frames():
+            if frames >= log.meta["frames"]:
+                source.release(frame)
+                break
+            current_trajectories, evicted = log.frame(frames)
+            for track_id, data in current_trajectories.items():
+                trajectories[track_id].append(data["position"])
+            for track_id in evicted:
+                del trajectories[track_id]
+            draw_detections(frame, current_trajectories)
+            draw_trajectories(frame, trajectories)
+            out.write(frame)
+            source.release(frame)
+            frames += 1
+    finally:
+        source.close()
+        cap.release()
+        out.release()
+    return {"video_path": output_path, "frames": frames}
@@ -0,0 +1,165 @@
+import cv2
+import numpy as np
+from django.conf import settings
+from ultralytics.engine.results import Results
+
+INFERENCE_MODES = ("native", "downscale", "tiled")
+MAX_DETECTIONS = 300
+
+
+def tile_origins(length, tile, overlap):
+    # Start offsets of tiles covering [0, length); the last tile is flush
+    # with the edge, so it may overlap its neighbour by more than overlap.
+    if length <= tile:
+        return [0]
+    step = max(1, int(tile * (1 - overlap)))
+    origins = list(range(0, length - tile, step))
+    origins.append(length - tile)
+    return origins
+
+
+def merge_detections(data, threshold, max_det=MAX_DETECTIONS):
+    # Greedy non-maximum merging of (x1, y1, x2, y2, conf, cls) rows from
+    # overlapping tiles, per class. Overlap is intersection over the smaller
+    # box, since a drone cut by a tile edge leaves a partial box inside the
+    # whole one, which IoU would keep apart. The kept box grows to cover the
+    # ones merged into it, so the centroid is that of the whole drone.
+    if len(data) == 0:
+        return data
+    data = data[np.argsort(-data[:, 4], kind="stable")]
+    areas = (data[:, 2] - data[:, 0]) * (data[:, 3] - data[:, 1])
+    merged = np.zeros(len(data), dtype=bool)
+    kept = []
+    for i in range(len(data)):
+        if merged[i]:
+            continue
+        row = data[i].copy()
+        rest = np.arange(i + 1, len(data))
+        rest = rest[~merged[rest] & (data[rest, 5] == row[5])]
+        if len(rest):
+            width = np.minimum(data[i, 2], data[rest, 2]) - np.maximum(data[i, 0], data[rest, 0])
+            height = np.minimum(data[i, 3], data[rest, 3]) - np.maximum(data[i, 1], data[rest, 1])
+            inter = np.clip(width, 0, None) * np.clip(height, 0, None)
+            overlap = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-9)
+            group = rest[overlap > threshold]
+            if len(group):
+                merged[group] = True
+                row[:2] = np.minimum(row[:2], data[group, :2].min(axis=0))
+                row[2:4] = np.maximum(row[2:4], data[group, 2:4].max(axis=0))
+        kept.append(row)
+        if len(kept) == max_det:
+            break
+    return np.stack(kept)
+
+
+class ResolutionAdapter:
+    # Prepares frames for the model and maps its detections back onto the
+    # source frame, so tracking, speeds (PIXEL_TO_METER) and zones always
+    # work in source pixels whatever the model saw.
+    #
+    #   native     frames go to the model as decoded (it letterboxes them)
+    #   downscale  frames larger than size are shrunk to that long side
+    #              first, and inferred at that size: cheap on HD/4K feeds
+    #   tiled      overlapping tile x tile crops at full resolution, plus the
+    #              whole frame downscaled to one tile for large drones, all
+    #              inferred as one batch and merged across tiles: for small,
+    #              far-away drones in 4K feeds
+    #
+    # predict() takes a list of frames and returns one ultralytics Results
+    # per frame in source coordinates, like model.predict().
+
+    def __init__(self, model, mode=None, size=None, tile_size=None, tile_overlap=None, full_frame=None,
+                 merge_threshold=None, tile_batch_size=None):
+        self.model = model
+        self.mode = mode or settings.INFERENCE_MODE
+        if self.mode not in INFERENCE_MODES:
+            raise ValueError(f"Unsupported inference mode: {self.mode}")
+        self.size = size or settings.INFERENCE_SIZE
+        self.tile_size = tile_size or settings.TILE_SIZE
+        self.tile_overlap = settings.TILE_OVERLAP if tile_overlap is None else tile_overlap
+        self.full_frame = settings.TILE_FULL_FRAME if full_frame is None else full_frame
+        self.merge_threshold = merge_threshold or settings.TILE_MERGE_THRESHOLD
+        self.tile_batch_size = tile_batch_size or settings.TILE_BATCH_SIZE
+        self.frames = 0
+        self.model_inputs = 0
+
+    def predict(self, frames):
+        self.frames += len(frames)
+        if self.mode == "native":
+            self.model_inputs += len(frames)
+            return self.model.predict(frames)
+        if self.mode == "downscale":
+            return self._predict_downscaled(frames)
+        return self._predict_tiled(frames)
+
+    def _downscale(self, frame, size):
+        # (image, scale) with the long side at most size
+        height, width = frame.shape[:2]
+        scale = size / max(height, width)
+        if scale >= 1:
+            return frame, 1.0
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(frame, new_size, interpolation=cv2.INTER_AREA), scale
+
+    def _predict_downscaled(self, frames):
+        images, scales = zip(*(self._downscale(frame, self.size) for frame in frames))
+        self.model_inputs += len(images)
+        results = self.model.predict(list(images), imgsz=self.size)
+        return [
+            self._result(frame, result.names, self._remap(result, scale, 0, 0, frame))
+            for frame, scale, result in zip(frames, scales, results)
+        ]
+
+    def _predict_tiled(self, frames):
+        # Every model input with the frame it came from and where it sits
+        images, placements = [], []
+        for index, frame in enumerate(frames):
+            height, width = frame.shape[:2]
+            whole = height <= self.tile_size and width <= self.tile_size
+            if self.full_frame or whole:
+                image, scale = self._downscale(frame, self.tile_size)
+                images.append(image)
+                placements.append((index, scale, 0, 0))
+            if whole:
+                continue
+            for y in tile_origins(height, self.tile_size, self.tile_overlap):
+                for x in tile_origins(width, self.tile_size, self.tile_overlap):
+                    images.append(frame[y:y + self.tile_size, x:x + self.tile_size])
+                    placements.append((index, 1.0, x, y))
+
+        detections = [[] for _ in frames]
+        names = {}
+        for start in range(0, len(images), self.tile_batch_size):
+            chunk = images[start:start + self.tile_batch_size]
+            results = self.model.predict(chunk, imgsz=self.tile_size)
+            for (index, scale, x, y), result in zip(placements[start:start + len(chunk)], results):
+                names = result.names
+                detections[index].append(self._remap(result, scale, x, y, frames[index]))
+        self.model_inputs += len(images)
+
+        return [
+            self._result(frame, names, merge_detections(np.concatenate(frame_detections), self.merge_threshold))
+            for frame, frame_detections in zip(frames, detections)
+        ]
+
+    def _remap(self, result, scale, x, y, frame):
+        # Detections of one model input in source frame coordinates
+        data = result.boxes.data.cpu().numpy()[:, :6].astype(np.float32)
+        data[:, :4] /= scale
+        data[:, [0, 2]] += x
+        data[:, [1, 3]] += y
+        height, width = frame.shape[:2]
+        data[:, [0, 2]] = np.clip(data[:, [0, 2]], 0, width)
+        data[:, [1, 3]] = np.clip(data[:, [1, 3]], 0, height)
+        return data
+
+    def _result(self, frame, names, data):
+        return Results(frame, path="", names=names, boxes=data)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "frames": self.frames,
+            "model_inputs": self.model_inputs,
+            "inputs_per_frame": self.model_inputs / self.frames if self.frames else 0.0,
+        }
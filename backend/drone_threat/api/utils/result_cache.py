@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from ultralytics.utils.checks import check_yaml
+
+from ..models import DetectionResultCache
+from . import model_registry, models_util
+from .onnx_backend import int8_path
+from .render_log import render_log_path
+from .trajectory_log import TrajectoryLogReader, log_path
+from .tracking import DRONE_CLASS_ID, PIXEL_TO_METER, load_yaml
+from .zones import get_zone_index
+
+# Content-addressed cache of detect_objects results. The key is a hash of
+# the source video's bytes, the model and every setting that changes the
+# output, so the same clip uploaded under another name is a hit and any
+# config change is a miss. Output files are hard-linked (or copied, across
+# filesystems) into RESULT_CACHE_DIR/<key>/ after a run and back into the
+# output directory on a hit. detect_objects replaces its outputs instead of
+# rewriting them in place, so the linked copies never change under the
+# cache. Beyond RESULT_CACHE_MAX_BYTES the least recently used entries are
+# evicted, and entries made under a different model/threshold config are
+# dropped at the next eviction pass.
+
+CACHE_VERSION = 3  # bump when a code change alters detection output
+HASH_CHUNK = 1 << 20
+CACHED_OPTIONS = ('motion_gate', 'adaptive_stride', 'video_output', 'batch_size')
+
+# result field -> (name inside the entry directory, output path for a clip)
+ARTIFACTS = {
+    "video_path": ("video.mp4", lambda output_dir, name: os.path.join(output_dir, f"{name}.mp4")),
+    "trajectory_log": ("trajectory.trajlog", log_path),
+    "json_path": ("trajectory.json", lambda output_dir, name: os.path.join(output_dir, f"{name}_trajectory.json")),
+    "render_log": ("render.renderlog", render_log_path),
+}
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    # sha256 of the file, read in chunks. Memoized on (size, mtime, inode),
+    # so an unchanged file is only read once per process.
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    with _digests_lock:
+        memo = _digests.get(path)
+    if memo is not None and memo[0] == signature:
+        return memo[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    with _digests_lock:
+        _digests[path] = (signature, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def _hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def model_config():
+    # Everything besides the per-request options that the results depend on
+    backend, weights, device, precision = model_registry.default_key()
+    if backend == "onnxruntime" and precision == "int8":
+        weights = int8_path(weights)
+    return {
+        "version": CACHE_VERSION,
+        "backend": backend,
+        "weights": weights,
+        "weights_digest": file_digest(weights) if os.path.isfile(weights) else None,
+        "device": device,
+        "precision": precision,
+        "inference": inference_config(),
+        "tracker_conf": settings.TRACKER_CONF,
+        "tracker": load_yaml(check_yaml(settings.TRACKER_CONFIG)),
+        "track_lost_frames": settings.TRACK_LOST_FRAMES,
+        "trajectory_history": settings.TRAJECTORY_HISTORY,
+        "thresholds": settings.THREAT_THRESHOLDS,
+        "zones": [(zone.name, zone.is_rect, zone.polygon.tolist()) for zone in get_zone_index().zones],
+        "drone_class": DRONE_CLASS_ID,
+        "pixel_to_meter": PIXEL_TO_METER,
+        "json_interval": models_util.JSON_INTERVAL,
+    }
+
+
+def inference_config():
+    # The inference mode with the settings it uses
+    config = {"mode": settings.INFERENCE_MODE}
+    if settings.INFERENCE_MODE == "downscale":
+        config["size"] = settings.INFERENCE_SIZE
+    elif settings.INFERENCE_MODE == "tiled":
+        config["tiles"] = (settings.TILE_SIZE, settings.TILE_OVERLAP, settings.TILE_FULL_FRAME,
+                           settings.TILE_MERGE_THRESHOLD)
+    return config
+
+
+def request_config(options):
+    # Resolved per-request options, with the settings they pull in
+    motion_gate = options.get("motion_gate")
+    adaptive_stride = options.get("adaptive_stride")
+    config = {
+        "video_output": options.get("video_output") or settings.VIDEO_OUTPUT,
+        # Batched inference is not always bit-identical to per-frame inference
+        "batch_size": options.get("batch_size") or settings.DETECTION_BATCH_SIZE,
+        "motion_gate": bool(settings.MOTION_GATE_ENABLED if motion_gate is None else motion_gate),
+        "adaptive_stride": bool(settings.STRIDE_SCHEDULER_ENABLED if adaptive_stride is None else adaptive_stride),
+    }
+    if config["motion_gate"]:
+        config["motion_gate_settings"] = (settings.MOTION_GATE_WIDTH, settings.MOTION_GATE_PIXEL_THRESHOLD,
+                                          settings.MOTION_GATE_MIN_CHANGE, settings.MOTION_GATE_MAX_SKIP)
+    if config["adaptive_stride"]:
+        config["stride_settings"] = (settings.STRIDE_IDLE, settings.STRIDE_BENIGN, settings.STRIDE_ALERT)
+    return config
+
+
+def cache_key(source_digest, config_hash, options):
+    return _hash([source_digest, config_hash, request_config(options)])
+
+
+def entry_dir(key):
+    return os.path.join(settings.RESULT_CACHE_DIR, key)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def _link(src, dst):
+    # Replaces dst with a hard link to src (a copy across filesystems);
+    # directories are linked file by file
+    _remove(dst)
+    if os.path.isdir(src):
+        os.makedirs(dst)
+        for name in os.listdir(src):
+            _link(os.path.join(src, name), os.path.join(dst, name))
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def get_cached(key, output_dir, output_filename):
+    entry = DetectionResultCache.objects.filter(key=key).first()
+    if entry is None:
+        return None
+    directory = entry_dir(key)
+    if not os.path.isdir(directory):
+        entry.delete()
+        return None
+
+    result = dict(entry.result)
+    for field, (name, output_path) in ARTIFACTS.items():
+        if result.get(field) is not None:
+            result[field] = output_path(output_dir, output_filename)
+            _link(os.path.join(directory, name), result[field])
+        else:
+            # Left by another run under this name (see detect_objects): a
+            # newer video would pass for a render of this entry's log
+            _remove(output_path(output_dir, output_filename))
+    DetectionResultCache.objects.filter(key=key).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    result["json_data"] = list(TrajectoryLogReader(result["trajectory_log"]).snapshots())
+    return result
+
+
+def put_cached(key, file_name, source_digest, config_hash, result):
+    # Links the run's outputs into a fresh entry directory, then records it
+    directory = entry_dir(key)
+    staging = f"{directory}.tmp-{os.getpid()}-{threading.get_ident()}"
+    _remove(staging)
+    os.makedirs(staging)
+    stored = {field: value for field, value in result.items() if field not in ("json_data", "timings")}
+    for field, (name, _) in ARTIFACTS.items():
+        if result.get(field) is not None:
+            _link(result[field], os.path.join(staging, name))
+    _remove(directory)
+    os.replace(staging, directory)
+
+    now = timezone.now()
+    DetectionResultCache.objects.update_or_create(
+        key=key,
+        defaults={"file_name": file_name, "source_digest": source_digest, "config_hash": config_hash,
+                  "result": stored, "size_bytes": _size(directory), "last_used_at": now},
+    )
+    evict(config_hash)
+
+
+def evict(config_hash=None):
+    # Entries from another model/threshold config can never be hit again;
+    # then least recently used entries go until the cache fits its budget
+    removed = 0
+    if config_hash is not None:
+        removed += _delete(DetectionResultCache.objects.exclude(config_hash=config_hash))
+
+    total = DetectionResultCache.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+    excess = total - settings.RESULT_CACHE_MAX_BYTES
+    if excess > 0:
+        oldest = []
+        for key, size in DetectionResultCache.objects.order_by('last_used_at').values_list('key', 'size_bytes'):
+            if excess <= 0:
+                break
+            oldest.append(key)
+            excess -= size
+        removed += _delete(DetectionResultCache.objects.filter(key__in=oldest))
+    return removed
+
+
+def _delete(entries):
+    keys = list(entries.values_list('key', flat=True))
+    for key in keys:
+        _remove(entry_dir(key))
+    DetectionResultCache.objects.filter(key__in=keys).delete()
+    return len(keys)
+
+
+def clear_cache():
+    return _delete(DetectionResultCache.objects.all())
+
+
+def detect_objects_cached(video_url, output_dir, output_filename, use_cache=None, **options):
+    # detect_objects with the result cache in front. The result carries
+    # "cache": "hit" or "miss". A run that asks for a timing report always
+    # runs, but its result is still stored.
+    if use_cache is None:
+        use_cache = settings.RESULT_CACHE_ENABLED
+    if not use_cache or not os.path.isfile(video_url):
+        return models_util.detect_objects(video_url, output_dir, output_filename, **options)
+
+    source_digest = file_digest(video_url)
+    config_hash = _hash(model_config())
+    key = cache_key(source_digest, config_hash, {name: options.get(name) for name in CACHED_OPTIONS})
+    if not options.get("timing_report"):
+        result = get_cached(key, output_dir, output_filename)
+        if result is not None:
+            return dict(result, cache="hit")
+
+    result = models_util.detect_objects(video_url, output_dir, output_filename, **options)
+    put_cached(key, output_filename, source_digest, config_hash, result)
+    return dict(result, cache="miss")
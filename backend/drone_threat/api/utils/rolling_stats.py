@@ -0,0 +1,143 @@
+from collections import deque
+
+import numpy as np
+
+# Trajectory points are integer pixel positions, so running sums and sums of
+# squares are exact Python ints and never drift. Every rule below is decided
+# from them with exact integer comparisons; only when the exact value sits on
+# the threshold (or, for the centroid-distance rule, inside the band the
+# cheap bounds cannot settle) is the original NumPy expression evaluated on
+# the window, which keeps the outputs identical to re-slicing the list.
+
+
+class RollingWindow:
+    # Sliding window over the last `size` integer samples with O(1) amortized
+    # push, running sum / sum of squares and monotonic deques for min / max.
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self.total = 0
+        self.total_sq = 0
+        self.pushed = 0
+        self._min = deque()
+        self._max = deque()
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, value):
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+
+        index = self.pushed
+        self.pushed += 1
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((index, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((index, value))
+
+        oldest = self.pushed - self.size
+        if self._min[0][0] < oldest:
+            self._min.popleft()
+        if self._max[0][0] < oldest:
+            self._max.popleft()
+
+    def min(self):
+        return self._min[0][1]
+
+    def max(self):
+        return self._max[0][1]
+
+    def range(self):
+        return self.max() - self.min()
+
+    def mean(self):
+        # Same expression (int / int) as sum(values) / len(values)
+        return self.total / len(self.values)
+
+    def scaled_variance(self):
+        # n**2 * population variance, exactly
+        n = len(self.values)
+        return n * self.total_sq - self.total * self.total
+
+
+class PointWindow:
+    def __init__(self, size):
+        self.size = size
+        self.x = RollingWindow(size)
+        self.y = RollingWindow(size)
+
+    def push(self, point):
+        self.x.push(point[0])
+        self.y.push(point[1])
+
+    def std_exceeds(self, limit):
+        # np.std(x_vals) > limit or np.std(y_vals) > limit
+        return self._axis_std_exceeds(self.x, limit) or self._axis_std_exceeds(self.y, limit)
+
+    @staticmethod
+    def _axis_std_exceeds(window, limit):
+        n = len(window)
+        scaled = window.scaled_variance()
+        bound = limit * limit * n * n
+        if scaled != bound:
+            return scaled > bound
+        return np.std(list(window.values)) > limit
+
+    def range_below(self, limit):
+        # max(x) - min(x) < limit and max(y) - min(y) < limit
+        return self.x.range() < limit and self.y.range() < limit
+
+    def mean_centroid_distance_below(self, radius):
+        # Mean Euclidean distance from the window centroid is bounded above by
+        # the RMS distance and below by RMS**2 / (farthest possible point).
+        n = len(self.x)
+        scaled_rms_sq = self.x.scaled_variance() + self.y.scaled_variance()
+        if scaled_rms_sq < radius * radius * n * n:
+            return True
+
+        centroid_x = self.x.mean()
+        centroid_y = self.y.mean()
+        reach_x = max(centroid_x - self.x.min(), self.x.max() - centroid_x)
+        reach_y = max(centroid_y - self.y.min(), self.y.max() - centroid_y)
+        reach = np.sqrt(reach_x ** 2 + reach_y ** 2)
+        if scaled_rms_sq / (n * n) >= (radius + 1e-6) * reach:
+            return False
+
+        x_vals, y_vals = self.x.values, self.y.values
+        distances = [np.sqrt((x - centroid_x)**2 + (y - centroid_y)**2) for x, y in zip(x_vals, y_vals)]
+        return np.mean(distances) < radius
+
+
+class TrackFeatures:
+    # Incremental per-track features read by the threat rules.
+
+    WINDOW_SIZES = (5, 10, 15)
+
+    def __init__(self, speed_window=5):
+        self.count = 0
+        self.windows = {size: PointWindow(size) for size in self.WINDOW_SIZES}
+        self.speeds = deque(maxlen=speed_window)
+
+    def push(self, point, speed):
+        self.count += 1
+        for window in self.windows.values():
+            window.push(point)
+        self.speeds.append(speed)
+
+    def average_speed(self):
+        # Plain left-to-right float sum, which is what np.mean does for fewer
+        # than eight values, so the reported speed is unchanged. (Python 3.12+
+        # sum() compensates rounding and would not match.)
+        total = 0.0
+        for speed in self.speeds:
+            total += speed
+        return total / len(self.speeds)
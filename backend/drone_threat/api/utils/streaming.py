@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from .model_registry import get_model
+from .models_util import JSON_INTERVAL
+from .resolution import ResolutionAdapter
+from .tracking import ThreatTracker, build_snapshot
+
+DEFAULT_STREAM_FPS = 30
+
+
+def open_source(source):
+    # Camera indices arrive as strings from the CLI / URL
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source)
+
+
+def latency_stats(latencies):
+    # Percentiles in milliseconds of latencies in seconds
+    if not latencies:
+        return None
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "p50": float(np.percentile(latencies_ms, 50)),
+        "p95": float(np.percentile(latencies_ms, 95)),
+        "max": float(latencies_ms.max()),
+    }
+
+
+class LatestFrameReader:
+    # Reads a live source (RTSP/HTTP URL, camera index or file) continuously
+    # on a background thread and keeps only the newest frame. When the
+    # consumer falls behind, older frames are overwritten and counted as
+    # dropped, so latency stays bounded instead of building a backlog.
+    #
+    # With replay=True a file is paced at its native frame rate, standing in
+    # for a live camera. on_frame, if given, is called from the reader
+    # thread after every new frame and at the end of the source.
+
+    def __init__(self, source, replay=False, on_frame=None):
+        self.cap = open_source(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video source: {source}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_STREAM_FPS
+        self.replay = replay
+        self.on_frame = on_frame
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._latest = None
+        self._consumed = True
+        self._eof = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="stream-reader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        started = time.monotonic()
+        while not self._stopped:
+            if self.replay:
+                due = started + self.frames_read / self.fps
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            ret, frame = self.cap.read()
+            # "Glass" time: when the frame became available to us (or, for a
+            # replayed file, when a live camera would have delivered it).
+            captured_at = started + self.frames_read / self.fps if self.replay else time.monotonic()
+            if not ret:
+                break
+            self.frames_read += 1
+
+            with self._cond:
+                if not self._consumed:
+                    self.frames_dropped += 1
+                self._latest = (self.frames_read, frame, captured_at)
+                self._consumed = False
+                self._cond.notify_all()
+            if self.on_frame is not None:
+                self.on_frame()
+
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+        if self.on_frame is not None:
+            self.on_frame()
+
+    def read(self, timeout=None):
+        # Returns (frame_number, frame, captured_at) for the newest unread
+        # frame, or None once the source is exhausted.
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._consumed or self._eof, timeout=timeout):
+                return None
+            if self._consumed:
+                return None
+            self._consumed = True
+            return self._latest
+
+    def poll(self):
+        # Like read(), but never waits: None when no new frame is ready
+        with self._cond:
+            if self._consumed:
+                return None
+            self._consumed = True
+            return self._latest
+
+    @property
+    def finished(self):
+        # The source is exhausted and its last frame has been taken
+        with self._cond:
+            return self._eof and self._consumed
+
+    def close(self):
+        self._stopped = True
+        self._thread.join(timeout=5)
+        self.cap.release()
+
+
+class LiveDetectionStream:
+    # Real-time detection over a live source. Iterating yields trajectory
+    # snapshots as they are produced (every JSON_INTERVAL seconds of stream
+    # time), each carrying the glass-to-alert latency of its frame.
+
+    def __init__(self, source, replay=False, on_snapshot=None, latency_window=1000):
+        self.source = source
+        self.replay = replay
+        self.on_snapshot = on_snapshot
+        self.frames_processed = 0
+        self.latencies = deque(maxlen=latency_window)
+        self.reader = None
+
+    def __iter__(self):
+        model = get_model()
+        # Keep one-off predictor setup out of the first frame's latency
+        model.warm_up()
+        model = ResolutionAdapter(model)
+        self.reader = LatestFrameReader(self.source, replay=self.replay)
+        threat_tracker = ThreatTracker(self.reader.fps)
+        last_frame_number = 0
+        last_json_time = 0
+
+        try:
+            while True:
+                item = self.reader.read()
+                if item is None:
+                    break
+                frame_number, frame, captured_at = item
+
+                result = model.predict([frame])[0]
+                current_time = frame_number / self.reader.fps
+                current_trajectories = threat_tracker.update(
+                    result.boxes.cpu().numpy(), frame, current_time,
+                    elapsed_frames=frame_number - last_frame_number,
+                )
+                last_frame_number = frame_number
+                self.frames_processed += 1
+
+                latency = time.monotonic() - captured_at
+                self.latencies.append(latency)
+
+                if current_time - last_json_time >= JSON_INTERVAL and current_trajectories:
+                    trajectory_snapshot = build_snapshot(current_time, current_trajectories)
+                    trajectory_snapshot["latency_ms"] = latency * 1000
+                    last_json_time = current_time
+                    if self.on_snapshot is not None:
+                        self.on_snapshot(trajectory_snapshot)
+                    yield trajectory_snapshot
+        finally:
+            self.reader.close()
+
+    def stats(self):
+        return {
+            "frames_read": self.reader.frames_read if self.reader else 0,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.reader.frames_dropped if self.reader else 0,
+            "latency_ms": latency_stats(self.latencies),
+        }
@@ -0,0 +1,60 @@
+from django.conf import settings
+
+IDLE = "idle"
+BENIGN = "benign"
+ALERT = "alert"
+
+
+class StrideScheduler:
+    # Chooses how often frames go through the model from the threat state of
+    # the last inferred frame: sparse sampling with nothing in view, a
+    # moderate rate while only safe drones are tracked, and every frame once
+    # any track is flagged malicious (which includes being inside a no-fly
+    # zone). Frames in between are coasted by the tracker, whose Kalman state
+    # still steps once per source frame, so speeds stay in per-frame units.
+    #
+    # should_infer() only says whether the stride makes a frame due; a due
+    # frame counts as inferred once mark_inferred() is called for it, so a
+    # later filter (the motion gate) can still skip it and the next frame
+    # stays due. All three are called in frame order, next to the tracker
+    # (see detect_objects), so a change of mode applies from the next frame.
+
+    def __init__(self, idle_stride=None, benign_stride=None, alert_stride=None):
+        self.strides = {
+            IDLE: idle_stride or settings.STRIDE_IDLE,
+            BENIGN: benign_stride or settings.STRIDE_BENIGN,
+            ALERT: alert_stride or settings.STRIDE_ALERT,
+        }
+        self.mode = IDLE
+        self.since_inference = None
+        self.frames = 0
+        self.inferred = 0
+        self.frames_by_mode = {mode: 0 for mode in self.strides}
+
+    def should_infer(self):
+        self.frames += 1
+        self.frames_by_mode[self.mode] += 1
+        if self.since_inference is not None and self.since_inference + 1 < self.strides[self.mode]:
+            self.since_inference += 1
+            return False
+        return True
+
+    def mark_inferred(self):
+        self.since_inference = 0
+        self.inferred += 1
+
+    def observe(self, current_trajectories):
+        if any(data["is_malicious"] for data in current_trajectories.values()):
+            self.mode = ALERT
+        elif current_trajectories:
+            self.mode = BENIGN
+        else:
+            self.mode = IDLE
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "inferred": self.inferred,
+            "skip_ratio": 1 - self.inferred / self.frames if self.frames else 0.0,
+            "frames_by_mode": dict(self.frames_by_mode),
+        }
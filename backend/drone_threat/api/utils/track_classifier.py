@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+import httpx
+import ollama
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+
+from .llm_cache import cache_key, get_cached, put_cached
+from .metrics import LLM_SECONDS, TRACK_VERDICTS
+from .ollama_util import PROMPT_VERSION, achat_structured, prepare_prompt
+
+# Per-track LLM classification. Every track in a run is classified on its
+# own, concurrently, with at most LLM_CONCURRENCY requests in flight. A call
+# that takes longer than LLM_TIMEOUT seconds, fails, or returns nothing
+# parseable falls back to the verdict of the rule-based is_malicious checks.
+
+LLM_ERRORS = (asyncio.TimeoutError, ollama.ResponseError, ollama.RequestError, httpx.HTTPError, OSError)
+
+
+def split_tracks(trajectory):
+    # {track_id: snapshots containing only that track}
+    if isinstance(trajectory, (str, bytes)):
+        trajectory = json.loads(trajectory)
+    tracks = defaultdict(list)
+    for snapshot in trajectory:
+        for drone in snapshot["drones"]:
+            tracks[drone["track_id"]].append({"timestamp": snapshot["timestamp"], "drones": [drone]})
+    return dict(tracks)
+
+
+def rule_based_verdict(track_snapshots, reason):
+    flags = [drone["is_malicious"] for snapshot in track_snapshots for drone in snapshot["drones"]]
+    flagged = sum(flags) / len(flags) if flags else 0.0
+    if flagged:
+        behaviour, confidence = "Malicious (rule-based)", flagged
+    else:
+        behaviour, confidence = "Normal Operation (rule-based)", 1.0
+    return {
+        "Behaviour": behaviour,
+        "Confidence": round(confidence * 100),
+        "Reasoning": f"{reason}; rule checks flagged {flagged:.0%} of samples.",
+    }
+
+
+async def classify_track(client, semaphore, track_id, track_snapshots, model, timeout):
+    key = cache_key(track_snapshots, model, PROMPT_VERSION)
+    cached = await sync_to_async(get_cached)(key)
+    if cached is not None:
+        return track_id, dict(cached, source="cache")
+
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                achat_structured(client, model, prepare_prompt(track_snapshots)), timeout,
+            )
+        except asyncio.TimeoutError:
+            LLM_SECONDS.observe(time.perf_counter() - start, outcome="timeout")
+            return track_id, dict(rule_based_verdict(track_snapshots, f"LLM timed out after {timeout}s"),
+                                  source="rules")
+        except LLM_ERRORS as exc:
+            LLM_SECONDS.observe(time.perf_counter() - start, outcome="error")
+            return track_id, dict(rule_based_verdict(track_snapshots, f"LLM unavailable ({exc})"),
+                                  source="rules")
+        LLM_SECONDS.observe(time.perf_counter() - start, outcome="ok" if result is not None else "invalid")
+
+    if result is None:
+        return track_id, dict(rule_based_verdict(track_snapshots, "LLM answer was invalid after a retry"),
+                              source="rules")
+    await sync_to_async(put_cached)(key, model, PROMPT_VERSION, result)
+    return track_id, dict(result, source="llm")
+
+
+async def classify_tracks(trajectory, model=None, concurrency=None, timeout=None):
+    # Async generator yielding (track_id, result) as each track finishes.
+    # result has Behaviour / Confidence / Reasoning plus "source": "llm",
+    # "cache" or "rules".
+    model = model or settings.OLLAMA_MODEL
+    timeout = timeout or settings.LLM_TIMEOUT
+    semaphore = asyncio.Semaphore(concurrency or settings.LLM_CONCURRENCY)
+    client = ollama.AsyncClient(host=settings.OLLAMA_HOST)
+
+    tasks = [
+        asyncio.ensure_future(classify_track(client, semaphore, track_id, track_snapshots, model, timeout))
+        for track_id, track_snapshots in split_tracks(trajectory).items()
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            track_id, result = await next_done
+            TRACK_VERDICTS.inc(source=result["source"])
+            yield track_id, result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@async_to_sync
+async def classify_all_tracks(trajectory, **kwargs):
+    # Blocking helper for sync callers: {track_id: result}
+    return {track_id: result async for track_id, result in classify_tracks(trajectory, **kwargs)}
@@ -0,0 +1,270 @@
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from ultralytics.trackers.bot_sort import BOTSORT
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+try:
+    from ultralytics.utils import YAML
+    load_yaml = YAML.load
+except ImportError:  # ultralytics < 8.3.1xx
+    from ultralytics.utils import yaml_load as load_yaml
+
+from .kalman_bank import KalmanBank
+from .metrics import RunTimings
+from .rolling_stats import TrackFeatures
+from .trajectory_buffer import TrajectoryBuffer
+from .zones import ZoneTracker, get_zone_index
+
+DRONE_CLASS_ID = 4
+PIXEL_TO_METER = 0.02
+
+TRACKER_MAP = {"bytetrack": BYTETracker, "botsort": BOTSORT}
+
+
+def create_tracker(tracker_cfg=None):
+    # Same construction as ultralytics' model.track() (default frame rate),
+    # but owned by the caller instead of the shared model.
+    cfg = IterableSimpleNamespace(**load_yaml(check_yaml(tracker_cfg or settings.TRACKER_CONFIG)))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg)
+
+
+class ThreatTracker:
+    # Per-video state: track association, Kalman smoothing, trajectories and
+    # the malicious-behaviour rules. Frames must be fed in order.
+
+    def __init__(self, fps, tracker_cfg=None, history=None, timings=None):
+        self.frame_time = 1 / fps
+        self.timings = timings or RunTimings()
+        self.tracker = create_tracker(tracker_cfg)
+        history = history or settings.TRAJECTORY_HISTORY
+        self.trajectories = defaultdict(lambda: TrajectoryBuffer(history))
+        self.kalman = KalmanBank()
+        self.previous_velocities = defaultdict(lambda: (0, 0))
+        self.features = defaultdict(TrackFeatures)
+        self.frame_index = 0  # updates seen by the tracker (its clock for track loss)
+        self.frame_number = 0  # source frames, including skipped / coasted ones
+        self.stepped_to = {}  # source frame each track's Kalman state refers to
+        self.last_seen = {}
+        self.flagged = set()
+        self.new_alerts = []
+        self.thresholds = settings.THREAT_THRESHOLDS
+        self.zone_index = get_zone_index()
+        self.zone_tracker = ZoneTracker(self.zone_index)
+        self.zone_events = []
+        self.evicted = []  # tracks whose drawn trajectory the last update dropped
+        self.current_time = 0
+        self.active = {}
+
+    def associate(self, detections, frame):
+        # Mirrors ultralytics' on_predict_postprocess_end: the tracker sees
+        # every frame, including ones without detections.
+        with self.timings.stage("tracking"):
+            tracks = self.tracker.update(detections, frame)
+        if len(tracks) == 0:
+            return None
+        # Columns: x1, y1, x2, y2, track_id, conf, cls, detection index.
+        # Boxes are clipped to the frame, as model.track() returns them.
+        tracks = np.asarray(tracks)
+        height, width = frame.shape[:2]
+        tracks[:, [0, 2]] = tracks[:, [0, 2]].clip(0, width)
+        tracks[:, [1, 3]] = tracks[:, [1, 3]].clip(0, height)
+        return tracks
+
+    def update(self, detections, frame, current_time, elapsed_frames=1):
+        # elapsed_frames is the number of source frames since the previous
+        # update or coast, so speeds stay correct when frames are dropped.
+        self.frame_index += 1
+        self.frame_number += elapsed_frames
+        self.current_time = current_time
+        self.new_alerts = []
+        self.zone_events = []
+        self.evicted = []
+        tracks = self.associate(detections, frame)
+        current_trajectories = {}
+        if tracks is not None:
+            drones = tracks[tracks[:, 6] == DRONE_CLASS_ID]
+            if len(drones):
+                current_trajectories = self.update_tracks(drones, current_time)
+
+        self.evict_lost_tracks()
+        self.active = current_trajectories
+        return current_trajectories
+
+    def coast(self, current_time):
+        # For frames that were not run through the model: tracks from the
+        # last update are carried forward on their Kalman predictions. Their
+        # verdicts, speeds and rule features are left as they were, and the
+        # frame does not count towards track loss (the tracker never saw it).
+        self.new_alerts = []
+        self.zone_events = []
+        self.evicted = []
+        self.frame_number += 1
+        if not self.active:
+            return {}
+        track_ids = list(self.active)
+        with self.timings.stage("kalman"):
+            self.catch_up(track_ids)
+            states = self.kalman.predict(track_ids)
+        for track_id in track_ids:
+            self.stepped_to[track_id] = self.frame_number + 1
+
+        current_trajectories = {}
+        for track_id, state in zip(track_ids, states):
+            data = self.active[track_id]
+            position = (int(state[0]), int(state[1]))
+            dx, dy = position[0] - data["position"][0], position[1] - data["position"][1]
+            x1, y1, x2, y2 = data["box"]
+            self.trajectories[track_id].append(position)
+            current_trajectories[track_id] = dict(
+                data, box=(x1 + dx, y1 + dy, x2 + dx, y2 + dy), position=position, timestamp=float(current_time),
+            )
+        self.active = current_trajectories
+        return current_trajectories
+
+    def update_tracks(self, tracks, current_time):
+        boxes = tracks[:, :4].astype(int)
+        centroids = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+        # One vectorized Kalman step for every drone in the frame
+        with self.timings.stage("kalman"):
+            self.catch_up(tracks[:, 4])
+            states = self.kalman.update_predict(tracks[:, 4], centroids.astype(np.float32))
+        # One spatial-index query for every drone's position
+        with self.timings.stage("zones"):
+            zone_sets = self.zone_index.zones_for(states[:, :2].astype(int))
+            self.zone_events = self.zone_tracker.update(tracks[:, 4], zone_sets, current_time)
+
+        with self.timings.stage("threat_rules"):
+            return self.apply_rules(boxes, tracks, states, zone_sets, current_time)
+
+    def apply_rules(self, boxes, tracks, states, zone_sets, current_time):
+        current_trajectories = {}
+        for box, track_id, conf, state, zones in zip(boxes, tracks[:, 4], tracks[:, 5], states, zone_sets):
+            data = self.update_track(track_id, box, conf, state, current_time, bool(zones))
+            current_trajectories[track_id] = data
+            self.last_seen[track_id] = self.frame_index
+            self.stepped_to[track_id] = self.frame_number + 1
+
+            # Alert once when a track turns malicious
+            if data["is_malicious"] and track_id not in self.flagged:
+                self.flagged.add(track_id)
+                self.new_alerts.append(build_alert(track_id, data))
+            elif not data["is_malicious"]:
+                self.flagged.discard(track_id)
+        return current_trajectories
+
+    def catch_up(self, track_ids):
+        # Kalman velocities are in pixels per source frame. A track that was
+        # not stepped on every frame since its last update (missed detection,
+        # or frames skipped by the scheduler) is first predicted forward to
+        # the current frame, one frame at a time.
+        lag = {}
+        for track_id in track_ids:
+            behind = self.frame_number - self.stepped_to.get(track_id, self.frame_number)
+            if behind > 0:
+                lag[track_id] = behind
+        while lag:
+            self.kalman.predict(list(lag))
+            lag = {track_id: behind - 1 for track_id, behind in lag.items() if behind > 1}
+
+    def evict_lost_tracks(self):
+        # The tracker never reuses an ID once it has been lost for longer
+        # than its track buffer, so per-track state (including the drawn
+        # trajectory) can be dropped then.
+        for track_id, seen in list(self.last_seen.items()):
+            if self.frame_index - seen > settings.TRACK_LOST_FRAMES:
+                del self.last_seen[track_id]
+                del self.trajectories[track_id]
+                self.evicted.append(track_id)
+                self.flagged.discard(track_id)
+                self.kalman.release(track_id)
+                self.stepped_to.pop(track_id, None)
+                self.previous_velocities.pop(track_id, None)
+                self.features.pop(track_id, None)
+                self.zone_events += self.zone_tracker.forget(track_id, self.current_time)
+
+    def update_track(self, track_id, box, conf, state, current_time, in_no_fly_zone=False):
+        x1, y1, x2, y2 = map(int, box)
+        predicted_pos = (int(state[0]), int(state[1]))
+        self.trajectories[track_id].append(predicted_pos)
+
+        velocity_x, velocity_y = float(state[2]), float(state[3])
+        prev_vx, prev_vy = self.previous_velocities[track_id]
+        velocity_magnitude = np.sqrt(velocity_x ** 2 + velocity_y ** 2)
+        velocity_magnitude = max(velocity_magnitude, 1e-5)
+
+        speed_mps = velocity_magnitude * PIXEL_TO_METER / self.frame_time
+        speed_kmph = speed_mps * 3.6
+
+        features = self.features[track_id]
+        features.push(predicted_pos, float(speed_kmph))
+        avg_speed = features.average_speed()
+        self.previous_velocities[track_id] = (velocity_x, velocity_y)
+
+        acceleration = np.sqrt((velocity_x - prev_vx) ** 2 + (velocity_y - prev_vy) ** 2)
+        is_malicious = self.is_malicious(features, in_no_fly_zone, avg_speed, acceleration)
+
+        return {
+            "box": (x1, y1, x2, y2),
+            "position": predicted_pos,
+            "speed_kmph": float(avg_speed),
+            "is_malicious": is_malicious,
+            "confidence": float(conf),
+            "timestamp": float(current_time)
+        }
+
+    def is_malicious(self, features, in_no_fly_zone, avg_speed, acceleration):
+        thresholds = self.thresholds
+        if avg_speed > thresholds["max_speed_kmph"]:
+            return True
+
+        if in_no_fly_zone:
+            return True
+
+        if acceleration > thresholds["max_acceleration"]:
+            return True
+
+        # Erratic movement over the last 5 points
+        if features.count > 5 and features.windows[5].std_exceeds(thresholds["erratic_std"]):
+            return True
+
+        # Loitering in place over the last 10 points
+        if features.count > 10 and features.windows[10].range_below(thresholds["loiter_range"]):
+            return True
+
+        # Circling / hovering around a point over the last 15 points
+        if features.count > 15 and features.windows[15].mean_centroid_distance_below(thresholds["circling_distance"]):
+            return True
+
+        return False
+
+
+def build_snapshot(current_time, current_trajectories):
+    return {
+        "timestamp": float(current_time),
+        "drones": [
+            {
+                "track_id": int(track_id),
+                "x": int(data["position"][0]),  # Ensure int
+                "y": int(data["position"][1]),  # Ensure int
+                "speed_kmph": float(data["speed_kmph"]),  # Ensure float
+                "is_malicious": bool(data["is_malicious"]),  # Ensure boolean
+                "confidence": float(data["confidence"])  # Ensure float
+            }
+            for track_id, data in current_trajectories.items()
+        ]
+    }
+
+
+def build_alert(track_id, data):
+    return {
+        "timestamp": float(data["timestamp"]),
+        "track_id": int(track_id),
+        "x": int(data["position"][0]),
+        "y": int(data["position"][1]),
+        "speed_kmph": float(data["speed_kmph"]),
+        "confidence": float(data["confidence"])
+    }
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+class TrajectoryBuffer:
+    # Fixed-capacity ring of the most recent (x, y) points of one track.
+    # Every point is written twice, `capacity` slots apart, so the last
+    # `len(self)` points are always one contiguous slice and points() never
+    # copies.
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity, 2), dtype=np.int32)
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, point):
+        end = (self._start + self._count) % self.capacity
+        self._data[end] = point
+        self._data[end + self.capacity] = point
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def points(self):
+        return self._data[self._start:self._start + self._count]
+
+    def last(self):
+        x, y = self._data[self._start + self._count - 1]
+        return int(x), int(y)
@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Append-only columnar log of trajectory snapshots. A log is a directory with
+# one raw little-endian file per column plus a small meta.json; each row is
+# one drone in one snapshot, so a snapshot is the run of rows sharing a
+# timestamp. Rows are only ever appended, timestamps never decrease, and a
+# crash at worst leaves the columns at slightly different lengths, in which
+# case the reader uses the rows present in all of them.
+
+LOG_VERSION = 1
+COLUMNS = (
+    ("timestamp", "<f8"),
+    ("track_id", "<i4"),
+    ("x", "<i4"),
+    ("y", "<i4"),
+    ("speed_kmph", "<f8"),
+    ("flags", "u1"),
+    ("confidence", "<f4"),
+)
+FLAG_MALICIOUS = 1
+FLUSH_ROWS = 256
+
+
+def log_path(output_dir, output_filename):
+    return os.path.join(output_dir, f"{output_filename}.trajlog")
+
+
+class TrajectoryLogWriter:
+    # Starts a new log at path, replacing any previous one. The old files are
+    # removed rather than truncated, so hard-linked copies (the result cache)
+    # keep their contents.
+
+    def __init__(self, path, fps=None):
+        self.path = path
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"version": LOG_VERSION, "columns": COLUMNS, "fps": fps}, f)
+        self.files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name, _ in COLUMNS}
+        self.pending = {name: [] for name, _ in COLUMNS}
+        self.pending_rows = 0
+        self.rows = 0
+
+    def append_snapshot(self, snapshot):
+        for drone in snapshot["drones"]:
+            self.pending["timestamp"].append(snapshot["timestamp"])
+            self.pending["track_id"].append(drone["track_id"])
+            self.pending["x"].append(drone["x"])
+            self.pending["y"].append(drone["y"])
+            self.pending["speed_kmph"].append(drone["speed_kmph"])
+            self.pending["flags"].append(FLAG_MALICIOUS if drone["is_malicious"] else 0)
+            self.pending["confidence"].append(drone["confidence"])
+        self.pending_rows += len(snapshot["drones"])
+        if self.pending_rows >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.pending_rows:
+            for name, dtype in COLUMNS:
+                self.files[name].write(np.asarray(self.pending[name], dtype=dtype).tobytes())
+                self.pending[name].clear()
+            self.rows += self.pending_rows
+            self.pending_rows = 0
+        for f in self.files.values():
+            f.flush()
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryLogReader:
+    # Columns are memory-mapped, so queries only touch the pages they read.
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != LOG_VERSION:
+            raise ValueError(f"Unsupported trajectory log version: {self.meta['version']}")
+
+        sizes = {
+            name: os.path.getsize(os.path.join(path, f"{name}.bin")) // np.dtype(dtype).itemsize
+            for name, dtype in COLUMNS
+        }
+        self.rows = min(sizes.values())
+        self.columns = {}
+        for name, dtype in COLUMNS:
+            if self.rows:
+                self.columns[name] = np.memmap(
+                    os.path.join(path, f"{name}.bin"), dtype=dtype, mode="r", shape=(self.rows,)
+                )
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return self.rows
+
+    def time_range(self, start=None, end=None):
+        # Row slice with start <= timestamp <= end; timestamps are sorted
+        timestamps = self.columns["timestamp"]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        hi = self.rows if end is None else int(np.searchsorted(timestamps, end, side="right"))
+        return slice(lo, max(lo, hi))
+
+    def rows_for_track(self, track_id, start=None, end=None):
+        window = self.time_range(start, end)
+        return np.flatnonzero(self.columns["track_id"][window] == track_id) + window.start
+
+    def select(self, rows):
+        # Column arrays for a slice or index array
+        return {name: np.asarray(column[rows]) for name, column in self.columns.items()}
+
+    def track(self, track_id, start=None, end=None):
+        return self.select(self.rows_for_track(track_id, start, end))
+
+    def snapshot_bounds(self, start=None, end=None, chunk_rows=65536):
+        # (lo, hi) row ranges of each snapshot, found by scanning the
+        # timestamp column a chunk at a time
+        window = self.time_range(start, end)
+        timestamps = self.columns["timestamp"]
+        lo = window.start
+        for chunk_start in range(window.start, window.stop, chunk_rows):
+            block_start = max(chunk_start - 1, window.start)
+            block = timestamps[block_start:min(chunk_start + chunk_rows, window.stop)]
+            for change in np.flatnonzero(np.diff(block)) + block_start + 1:
+                yield lo, int(change)
+                lo = int(change)
+        if lo < window.stop:
+            yield lo, window.stop
+
+    def snapshots(self, start=None, end=None):
+        # Rebuilds snapshots in the format produced by build_snapshot
+        for lo, hi in self.snapshot_bounds(start, end):
+            data = self.select(slice(lo, hi))
+            yield {
+                "timestamp": float(data["timestamp"][0]),
+                "drones": [
+                    {
+                        "track_id": int(data["track_id"][i]),
+                        "x": int(data["x"][i]),
+                        "y": int(data["y"][i]),
+                        "speed_kmph": float(data["speed_kmph"][i]),
+                        "is_malicious": bool(data["flags"][i] & FLAG_MALICIOUS),
+                        "confidence": float(data["confidence"][i]),
+                    }
+                    for i in range(hi - lo)
+                ],
+            }
+
+
+def export_json(log, json_path, start=None, end=None):
+    # Same layout as the old trajectory_data.json, written one snapshot at a
+    # time so the export does not hold the whole run in memory.
+    reader = log if isinstance(log, TrajectoryLogReader) else TrajectoryLogReader(log)
+    with open(json_path + ".tmp", "w") as f:
+        f.write("[")
+        written = 0
+        for snapshot in reader.snapshots(start, end):
+            f.write(",\n" if written else "\n")
+            f.write(json.dumps(snapshot, indent=2))
+            written += 1
+        f.write("\n]" if written else "]")
+    os.replace(json_path + ".tmp", json_path)
+    return json_path
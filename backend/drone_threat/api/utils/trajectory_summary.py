@@ -0,0 +1,193 @@
+import heapq
+import json
+from collections import defaultdict
+
+import numpy as np
+
+from .tracking import PIXEL_TO_METER
+from .zones import get_zone_index
+
+# Compresses trajectory snapshots (the build_snapshot format) into a few
+# numbers per track, so the LLM prompt stays small however long the video is.
+
+PATH_EPSILON = 5.0  # pixels; Douglas-Peucker tolerance for the reported path
+MAX_PATH_POINTS = 20  # most significant points kept when the path needs more
+LOITER_RADIUS = 15  # pixels a drone may drift and still count as loitering
+LOITER_MIN_SECONDS = 2.0
+MAX_INTERVALS = 5  # longest loiter / no-fly-zone intervals listed per track
+
+
+def _farthest(points, first, last):
+    # (distance, index) of the point between first and last farthest from
+    # the chord joining them
+    start, end = points[first], points[last]
+    segment = end - start
+    inner = points[first + 1:last] - start
+    length = np.hypot(*segment)
+    if length == 0:
+        distances = np.hypot(inner[:, 0], inner[:, 1])
+    else:
+        distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+    farthest = int(np.argmax(distances))
+    return float(distances[farthest]), first + 1 + farthest
+
+
+def douglas_peucker(points, epsilon, max_points=None):
+    # Indices of the points kept by Douglas-Peucker simplification. Segments
+    # are split farthest-point-first, so with max_points the result is the
+    # max_points most significant points; without it (or when the budget is
+    # not reached) it is the usual Douglas-Peucker result.
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+    points = np.asarray(points, dtype=np.float64)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    kept = 2
+    heap = [(-distance, index, 0, n - 1) for distance, index in [_farthest(points, 0, n - 1)]]
+    while heap and (max_points is None or kept < max_points):
+        distance, split, first, last = heapq.heappop(heap)
+        if -distance <= epsilon:
+            break
+        keep[split] = True
+        kept += 1
+        for lo, hi in ((first, split), (split, last)):
+            if hi - lo >= 2:
+                distance, index = _farthest(points, lo, hi)
+                heapq.heappush(heap, (-distance, index, lo, hi))
+    return np.flatnonzero(keep)
+
+
+def simplify_path(points, epsilon=PATH_EPSILON, max_points=MAX_PATH_POINTS):
+    return douglas_peucker(points, epsilon, max_points)
+
+
+def runs(mask):
+    # (start, stop) index pairs of the True runs in a boolean array
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def first_outside(xy, i, radius):
+    # Index of the first point after i farther than radius from xy[i] (or
+    # len(xy)), scanning in growing chunks so short stretches stay cheap.
+    n, start, size = len(xy), i + 1, 32
+    while start < n:
+        stop = min(start + size, n)
+        outside = np.flatnonzero(np.hypot(*(xy[start:stop] - xy[i]).T) > radius)
+        if len(outside):
+            return start + int(outside[0])
+        start, size = stop, size * 2
+    return n
+
+
+def loiter_intervals(t, xy, radius=LOITER_RADIUS, min_seconds=LOITER_MIN_SECONDS):
+    # Maximal stretches where the drone stays within `radius` of where the
+    # stretch started, kept if they last at least `min_seconds`.
+    intervals = []
+    i = 0
+    while i < len(t):
+        j = first_outside(xy, i, radius)
+        if t[j - 1] - t[i] >= min_seconds:
+            intervals.append((float(t[i]), float(t[j - 1])))
+            i = j
+        else:
+            i += 1
+    return intervals
+
+
+def longest(intervals, limit=MAX_INTERVALS):
+    # The `limit` longest (start, end) intervals, in time order
+    chosen = sorted(intervals, key=lambda interval: interval[1] - interval[0], reverse=True)[:limit]
+    return [[round(start, 2), round(end, 2)] for start, end in sorted(chosen)]
+
+
+def zone_dwell(t, xy, index):
+    dwell = []
+    point_ids, zone_ids = index.query(xy)
+    for zone in np.unique(zone_ids):
+        inside = np.zeros(len(t), dtype=bool)
+        inside[point_ids[zone_ids == zone]] = True
+        intervals = [(float(t[start]), float(t[stop - 1])) for start, stop in runs(inside)]
+        if intervals:
+            dwell.append({
+                "zone": index.zones[zone].name,
+                "entries": len(intervals),
+                "seconds": round(sum(end - start for start, end in intervals), 2),
+                "intervals": longest(intervals),
+            })
+    return dwell
+
+
+def summarize_track(track_id, t, xy, speed, malicious, confidence, index):
+    duration = float(t[-1] - t[0])
+    steps = np.hypot(*np.diff(xy, axis=0).T) if len(xy) > 1 else np.zeros(0)
+    path_length = float(steps.sum())
+    displacement = float(np.hypot(*(xy[-1] - xy[0])))
+
+    dt = np.diff(t)
+    valid = dt > 0
+    # km/h gained per second between snapshots
+    acceleration = np.diff(speed)[valid] / dt[valid] if len(t) > 1 else np.zeros(0)
+
+    loiters = loiter_intervals(t, xy)
+    kept = simplify_path(xy)
+    return {
+        "track_id": int(track_id),
+        "first_seen": round(float(t[0]), 2),
+        "last_seen": round(float(t[-1]), 2),
+        "samples": int(len(t)),
+        "path": [[int(x), int(y), round(float(t[i]), 1)] for i, (x, y) in zip(kept, xy[kept])],
+        "distance_m": round(path_length * PIXEL_TO_METER, 2),
+        # 1.0 = straight line, near 0 = circling / hovering
+        "straightness": round(displacement / path_length, 2) if path_length > 0 else 0.0,
+        "speed_kmph": {
+            "mean": round(float(speed.mean()), 1),
+            "max": round(float(speed.max()), 1),
+            "p95": round(float(np.percentile(speed, 95)), 1),
+        },
+        "acceleration_kmph_per_s": {
+            "mean_abs": round(float(np.abs(acceleration).mean()), 1) if len(acceleration) else 0.0,
+            "max_abs": round(float(np.abs(acceleration).max()), 1) if len(acceleration) else 0.0,
+        },
+        "dwell_seconds": round(duration, 2),
+        "loitering": {
+            "seconds": round(sum(end - start for start, end in loiters), 2),
+            "intervals": longest(loiters),
+        },
+        "no_fly_zone": zone_dwell(t, xy, index),
+        "flagged_malicious_ratio": round(float(malicious.mean()), 2),
+        "mean_confidence": round(float(confidence.mean()), 2),
+    }
+
+
+def summarize_trajectory(trajectory):
+    # `trajectory` is the list of snapshots (or its JSON text).
+    if isinstance(trajectory, (str, bytes)):
+        trajectory = json.loads(trajectory)
+
+    rows = defaultdict(list)
+    for snapshot in trajectory:
+        for drone in snapshot["drones"]:
+            rows[drone["track_id"]].append((
+                snapshot["timestamp"], drone["x"], drone["y"], drone["speed_kmph"],
+                drone["is_malicious"], drone["confidence"],
+            ))
+
+    index = get_zone_index()
+    tracks = []
+    for track_id, samples in sorted(rows.items()):
+        data = np.array(samples, dtype=np.float64)
+        tracks.append(summarize_track(
+            track_id, data[:, 0], data[:, 1:3], data[:, 3], data[:, 4], data[:, 5], index,
+        ))
+
+    # Only the zones some track entered; a site may define thousands
+    entered = sorted({entry["zone"] for track in tracks for entry in track["no_fly_zone"]})
+    zones = {zone.name: zone for zone in index.zones}
+    timestamps = [snapshot["timestamp"] for snapshot in trajectory]
+    return {
+        "video_seconds": round(max(timestamps) - min(timestamps), 2) if timestamps else 0.0,
+        "no_fly_zones": [zones[name].as_dict() for name in entered],
+        "tracks": tracks,
+    }
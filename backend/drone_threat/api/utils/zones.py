@@ -0,0 +1,197 @@
+import json
+import threading
+
+import numpy as np
+from django.conf import settings
+
+# No-fly zones. Zones come from settings.NO_FLY_ZONES or, when set, the JSON
+# file named by settings.NO_FLY_ZONES_FILE; each entry is either
+#
+#   {"name": "gate", "rect": [x_min, y_min, x_max, y_max]}
+#   {"name": "perimeter", "polygon": [[x, y], [x, y], ...]}
+#
+# in pixel coordinates. Rectangles include their edges. Polygons use the
+# even-odd (crossing number) rule.
+#
+# ZoneIndex buckets zones into a uniform grid over their bounding boxes, so a
+# query only tests each point against the zones whose boxes share its cell,
+# and all point/zone/edge tests for a frame run as one set of array
+# operations.
+
+
+class Zone:
+    def __init__(self, name, polygon, is_rect=False):
+        self.name = name
+        self.polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+        self.is_rect = is_rect
+        self.bbox = (*self.polygon.min(axis=0), *self.polygon.max(axis=0))
+
+    @classmethod
+    def from_config(cls, entry, default_name):
+        if isinstance(entry, (list, tuple)):
+            entry = {"rect": entry}
+        name = str(entry.get("name", default_name))
+        if "rect" in entry:
+            x_min, y_min, x_max, y_max = entry["rect"]
+            return cls(name, [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)], is_rect=True)
+        if "polygon" in entry and len(entry["polygon"]) >= 3:
+            return cls(name, entry["polygon"])
+        raise ValueError(f"No-fly zone {name!r} needs a 'rect' or a 'polygon' with at least 3 points")
+
+    def as_dict(self):
+        return {"name": self.name, "bbox": [int(v) for v in self.bbox]}
+
+
+def load_zones():
+    if settings.NO_FLY_ZONES_FILE:
+        with open(settings.NO_FLY_ZONES_FILE) as f:
+            entries = json.load(f)
+    else:
+        entries = settings.NO_FLY_ZONES
+    return [Zone.from_config(entry, f"zone-{i}") for i, entry in enumerate(entries)]
+
+
+class ZoneIndex:
+    def __init__(self, zones, cell_size=None):
+        self.zones = list(zones)
+        self.cell_size = cell_size or settings.ZONE_GRID_CELL
+        n = len(self.zones)
+        self.bboxes = np.array([zone.bbox for zone in self.zones], dtype=np.float64).reshape(n, 4)
+        self.is_rect = np.array([zone.is_rect for zone in self.zones], dtype=bool)
+
+        # Polygon edges, flattened; zone z owns edges edge_start[z]:edge_start[z + 1]
+        starts = [zone.polygon for zone in self.zones]
+        ends = [np.roll(zone.polygon, -1, axis=0) for zone in self.zones]
+        self.edge_a = np.concatenate(starts) if n else np.zeros((0, 2))
+        self.edge_b = np.concatenate(ends) if n else np.zeros((0, 2))
+        self.edge_start = np.concatenate(([0], np.cumsum([len(zone.polygon) for zone in self.zones])))
+
+        # Grid over all bounding boxes; cell c holds cell_zones[cell_start[c]:cell_start[c + 1]]
+        if n:
+            self.origin = np.floor(self.bboxes[:, :2].min(axis=0) / self.cell_size).astype(np.int64)
+            top = np.floor(self.bboxes[:, 2:].max(axis=0) / self.cell_size).astype(np.int64)
+            self.shape = top - self.origin + 1
+        else:
+            self.origin = np.zeros(2, dtype=np.int64)
+            self.shape = np.zeros(2, dtype=np.int64)
+        buckets = [[] for _ in range(int(self.shape[0] * self.shape[1]))]
+        for z, (x_min, y_min, x_max, y_max) in enumerate(self.bboxes):
+            cx0, cy0 = self._cell(x_min, y_min)
+            cx1, cy1 = self._cell(x_max, y_max)
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    buckets[cx * self.shape[1] + cy].append(z)
+        self.cell_start = np.concatenate(([0], np.cumsum([len(bucket) for bucket in buckets]))).astype(np.intp)
+        self.cell_zones = np.array([z for bucket in buckets for z in bucket], dtype=np.intp)
+
+    def __len__(self):
+        return len(self.zones)
+
+    def _cell(self, x, y):
+        return (int(np.floor(x / self.cell_size)) - self.origin[0],
+                int(np.floor(y / self.cell_size)) - self.origin[1])
+
+    def query(self, points):
+        # All (point index, zone index) pairs with the point inside the zone
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        empty = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        if not len(self.zones) or not len(points):
+            return empty
+
+        # Candidates: zones registered in each point's grid cell
+        cells = np.floor(points / self.cell_size).astype(np.int64) - self.origin
+        on_grid = np.all((cells >= 0) & (cells < self.shape), axis=1)
+        point_ids = np.flatnonzero(on_grid)
+        cell_ids = cells[point_ids, 0] * self.shape[1] + cells[point_ids, 1]
+        counts = self.cell_start[cell_ids + 1] - self.cell_start[cell_ids]
+        if not counts.sum():
+            return empty
+        pair_points = np.repeat(point_ids, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_zones = self.cell_zones[np.repeat(self.cell_start[cell_ids], counts) + offsets]
+
+        # Bounding boxes (exact for rectangles, inclusive)
+        px, py = points[pair_points, 0], points[pair_points, 1]
+        boxes = self.bboxes[pair_zones]
+        inside = (px >= boxes[:, 0]) & (px <= boxes[:, 2]) & (py >= boxes[:, 1]) & (py <= boxes[:, 3])
+        pair_points, pair_zones, px, py = pair_points[inside], pair_zones[inside], px[inside], py[inside]
+
+        # Crossing-number test for the remaining polygon pairs
+        polygon = ~self.is_rect[pair_zones]
+        if polygon.any():
+            poly_pairs = np.flatnonzero(polygon)
+            zones = pair_zones[poly_pairs]
+            edge_counts = self.edge_start[zones + 1] - self.edge_start[zones]
+            edge_pairs = np.repeat(np.arange(len(poly_pairs)), edge_counts)
+            edge_offsets = np.arange(edge_counts.sum()) - np.repeat(np.cumsum(edge_counts) - edge_counts, edge_counts)
+            edges = np.repeat(self.edge_start[zones], edge_counts) + edge_offsets
+            ex, ey = px[poly_pairs][edge_pairs], py[poly_pairs][edge_pairs]
+            (x1, y1), (x2, y2) = self.edge_a[edges].T, self.edge_b[edges].T
+            straddles = (y1 > ey) != (y2 > ey)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crossing_x = x1 + (ey - y1) * (x2 - x1) / (y2 - y1)
+            crossings = np.bincount(edge_pairs, weights=straddles & (ex < crossing_x), minlength=len(poly_pairs))
+            keep = np.ones(len(pair_zones), dtype=bool)
+            keep[poly_pairs] = crossings.astype(np.int64) % 2 == 1
+            pair_points, pair_zones = pair_points[keep], pair_zones[keep]
+        return pair_points, pair_zones
+
+    def zones_for(self, points):
+        # One set of zone indices per point
+        result = [set() for _ in range(len(np.asarray(points).reshape(-1, 2)))]
+        for point, zone in zip(*self.query(points)):
+            result[point].add(int(zone))
+        return result
+
+    def contains_any(self, points):
+        inside = np.zeros(len(np.asarray(points).reshape(-1, 2)), dtype=bool)
+        inside[self.query(points)[0]] = True
+        return inside
+
+
+class ZoneTracker:
+    # Follows which zones each track is in and reports entries and exits.
+
+    def __init__(self, index):
+        self.index = index
+        self.current = {}
+
+    def update(self, track_ids, zone_sets, timestamp):
+        events = []
+        for track_id, zones in zip(track_ids, zone_sets):
+            previous = self.current.get(track_id, set())
+            events += [self._event("enter", track_id, zone, timestamp) for zone in sorted(zones - previous)]
+            events += [self._event("exit", track_id, zone, timestamp) for zone in sorted(previous - zones)]
+            self.current[track_id] = zones
+        return events
+
+    def forget(self, track_id, timestamp):
+        # The track was lost while inside these zones
+        zones = self.current.pop(track_id, set())
+        return [self._event("exit", track_id, zone, timestamp, lost=True) for zone in sorted(zones)]
+
+    def _event(self, kind, track_id, zone, timestamp, lost=False):
+        event = {"event": kind, "track_id": int(track_id), "zone": self.index.zones[zone].name,
+                 "timestamp": float(timestamp)}
+        if lost:
+            event["lost"] = True
+        return event
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_zone_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ZoneIndex(load_zones())
+        return _index
+
+
+def reload_zones():
+    global _index
+    with _index_lock:
+        _index = None
+    return get_zone_index()
@@ -1,13 +1,72 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 import os
 
+from .models import AnalysisJob
+from .serializers import JobOptionsSerializer
 from .utils.uploads import pre_processed_path,post_processed_path
-from .utils.models_util import detect_objects
+from .utils.result_cache import detect_objects_cached
+from .utils.render_log import ensure_rendered, render_log_path
+from .utils import jobs
+from .utils.metrics import registry
 
 @api_view(['GET'])
 def process_video(request,file_name:str):
     file_path = pre_processed_path(file_name)
-    res = detect_objects(file_path, post_processed_path(),file_name)
+    # ?refresh=1 re-processes even when an identical clip is cached
+    res = detect_objects_cached(file_path, post_processed_path(), file_name,
+                                use_cache=False if request.query_params.get('refresh') == '1' else None)
     return Response(res)
+
+@api_view(['GET'])
+def render_video(request,file_name:str):
+    # Annotated video for a clip processed with video_output="deferred",
+    # rendered on first request
+    log_path = render_log_path(post_processed_path(), file_name)
+    if not os.path.exists(os.path.join(log_path, "meta.json")):
+        return Response({"error": f"No render log for: {file_name}"}, status=status.HTTP_404_NOT_FOUND)
+    res = ensure_rendered(pre_processed_path(file_name), log_path, post_processed_path(file_name))
+    return Response(res)
+
+@api_view(['POST'])
+def submit_job(request,file_name:str):
+    if not os.path.exists(pre_processed_path(file_name)):
+        return Response({"error": f"Unknown video: {file_name}"}, status=status.HTTP_404_NOT_FOUND)
+    serializer = JobOptionsSerializer(data=request.data, partial=True)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    job = jobs.submit_job(file_name, options=serializer.validated_data)
+    return Response({"job_id": str(job.id), "status": job.status}, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+def job_status(request,job_id):
+    job = get_object_or_404(AnalysisJob, pk=job_id)
+    return Response(job.as_dict())
+
+@api_view(['GET'])
+def job_progress(request,job_id):
+    job = get_object_or_404(AnalysisJob, pk=job_id)
+    return Response({"job_id": str(job.id), "status": job.status, "progress": job.progress})
+
+@api_view(['GET'])
+def job_result(request,job_id):
+    job = get_object_or_404(AnalysisJob, pk=job_id)
+    if job.status != AnalysisJob.SUCCEEDED:
+        return Response(job.as_dict(), status=status.HTTP_409_CONFLICT)
+    return Response(job.result)
+
+@api_view(['POST'])
+def cancel_job(request,job_id):
+    job = get_object_or_404(AnalysisJob, pk=job_id)
+    job = jobs.cancel_job(job)
+    return Response(job.as_dict())
+
+def metrics(request):
+    # Prometheus text format; only served to the addresses in METRICS_ALLOWED_IPS
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'drone_threat.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up; serves /api/jobs/<job_id>/events
+from api.asgi import with_job_events  # noqa: E402
+
+application = with_job_events(django_application)
+
+from api.utils.model_registry import warm_up_on_start  # noqa: E402
+
+warm_up_on_start()
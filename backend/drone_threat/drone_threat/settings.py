@@ -132,4 +132,92 @@ MEDIA_URL = '/media/'  # URL prefix for media files
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Object detection model
+# Models are cached per worker process, keyed by backend, weights, device and precision.
+YOLO_WEIGHTS = os.environ.get('YOLO_WEIGHTS', 'yolov8n.pt')
+YOLO_DEVICE = os.environ.get('YOLO_DEVICE') or None  # None lets ultralytics pick
+YOLO_PRECISION = os.environ.get('YOLO_PRECISION', 'fp32')  # 'fp32' or 'fp16'
+YOLO_WARMUP = os.environ.get('YOLO_WARMUP', '0') == '1'  # load and warm up when the WSGI/ASGI server starts
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'ultralytics')  # 'ultralytics' or 'onnxruntime' (CPU)
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', '0'))  # CPU threads: torch's for the whole process, and each ONNX session's; 0 keeps the library default
+ONNX_WEIGHTS = os.environ.get('ONNX_WEIGHTS', 'yolov8n.onnx')  # made by `manage.py export_onnx`
+ONNX_PRECISION = os.environ.get('ONNX_PRECISION', 'fp32')  # 'fp32' or 'int8' (loads <name>.int8.onnx)
+
+# Inference input (api/utils/resolution.py); boxes are always mapped back to source pixels.
+# 'native' hands frames to the model as decoded, 'downscale' shrinks them to INFERENCE_SIZE first,
+# 'tiled' infers overlapping full-resolution tiles (small drones in 4K feeds)
+INFERENCE_MODE = os.environ.get('INFERENCE_MODE', 'native')
+INFERENCE_SIZE = int(os.environ.get('INFERENCE_SIZE', '640'))  # long side in downscale mode, in pixels
+TILE_SIZE = int(os.environ.get('TILE_SIZE', '640'))  # square tile side in tiled mode, in pixels
+TILE_OVERLAP = float(os.environ.get('TILE_OVERLAP', '0.2'))  # fraction of a tile shared with each neighbour
+TILE_FULL_FRAME = os.environ.get('TILE_FULL_FRAME', '1') == '1'  # also infer the downscaled whole frame (large drones)
+TILE_MERGE_THRESHOLD = 0.5  # intersection over the smaller box above which detections from different tiles merge
+TILE_BATCH_SIZE = int(os.environ.get('TILE_BATCH_SIZE', '16'))  # tiles per inference call
+
+# Detection pipeline
+DETECTION_BATCH_SIZE = int(os.environ.get('DETECTION_BATCH_SIZE', '1'))  # frames per inference call
+TRACKER_CONFIG = 'botsort.yaml'  # ultralytics tracker config used for track IDs
+TRACKER_CONF = 0.1  # detection confidence floor; as model.track(), so the tracker's low-score pass sees 0.1-0.25
+PIPELINE_QUEUE_SIZE = 4  # batches buffered between decode/infer/annotate/encode stages
+FRAME_POOL_SIZE = 32  # preallocated decode buffers; bounds the frames in flight across the pipeline
+VIDEO_OUTPUT = os.environ.get('VIDEO_OUTPUT', 'encode')  # 'encode', 'deferred' (render on request) or 'none'
+PRINT_SNAPSHOTS = os.environ.get('PRINT_SNAPSHOTS', '1') == '1'  # echo every trajectory snapshot to stdout
+TRACK_LOST_FRAMES = 30  # frames a track may go unseen before its state is dropped (tracker track_buffer)
+TRAJECTORY_HISTORY = 300  # points kept (and drawn) per track
+
+# Threat rules (ThreatTracker.is_malicious); distances in pixels
+THREAT_THRESHOLDS = {
+    "max_speed_kmph": 50,  # average speed above this is malicious
+    "max_acceleration": 20,  # change in Kalman velocity between frames
+    "erratic_std": 30,  # position std over the last 5 points
+    "loiter_range": 10,  # x and y range over the last 10 points
+    "circling_distance": 20,  # mean distance from the centroid of the last 15 points
+}
+
+# Background analysis jobs (api/utils/jobs.py)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))  # local worker processes
+JOB_MAX_ATTEMPTS = 2  # runs per job before it is left failed
+JOB_START_METHOD = 'spawn'  # multiprocessing start method for job workers
+EVENT_SUBSCRIBER_QUEUE_SIZE = 100  # pushed events buffered per client before the oldest are dropped
+
+# Trajectory analysis LLM (api/utils/ollama_util.py)
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST') or None  # None uses the ollama client default
+OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'qwen2.5-coder:1.5b')
+LLM_CACHE_MAX_ENTRIES = 1000  # cached analyses kept; least recently used are evicted first
+LLM_CACHE_TTL = 7 * 24 * 3600  # seconds a cached analysis stays valid
+LLM_CONCURRENCY = 4  # per-track classification requests in flight at once
+LLM_TIMEOUT = 30  # seconds per request before falling back to the rule-based verdict
+LLM_MAX_RETRIES = 1  # extra attempts when the answer does not match the response schema
+
+# Motion gate (api/utils/motion_gate.py): skip inference on frames where nothing moved
+MOTION_GATE_ENABLED = os.environ.get('MOTION_GATE_ENABLED', '0') == '1'
+MOTION_GATE_WIDTH = 160  # width of the downscaled frame that is compared
+MOTION_GATE_PIXEL_THRESHOLD = 25  # grey-level difference for a pixel to count as changed
+MOTION_GATE_MIN_CHANGE = 0.002  # fraction of changed pixels needed to run the model
+MOTION_GATE_MAX_SKIP = 10  # frames in a row that may be skipped before inference is forced
+
+# Adaptive inference stride (api/utils/stride.py): run the model on every Nth frame
+STRIDE_SCHEDULER_ENABLED = os.environ.get('STRIDE_SCHEDULER_ENABLED', '0') == '1'
+STRIDE_IDLE = 6  # no drones tracked
+STRIDE_BENIGN = 2  # only safe drones tracked
+STRIDE_ALERT = 1  # a drone is flagged malicious or is inside a no-fly zone
+
+# No-fly zones (api/utils/zones.py), in pixel coordinates. Entries are
+# {"name": ..., "rect": [x_min, y_min, x_max, y_max]} or {"name": ..., "polygon": [[x, y], ...]}.
+NO_FLY_ZONES = [{"name": "zone-0", "rect": [200, 150, 400, 350]}]
+NO_FLY_ZONES_FILE = os.environ.get('NO_FLY_ZONES_FILE') or None  # JSON list that replaces NO_FLY_ZONES
+ZONE_GRID_CELL = 64  # pixels per side of a spatial index cell
+
+# Detection result cache (api/utils/result_cache.py), keyed by video content + model + config
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', '1') == '1'
+RESULT_CACHE_DIR = os.path.join(MEDIA_ROOT, 'result_cache')  # one directory of outputs per entry
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(10 * 1024 ** 3)))  # LRU beyond this
+
+# Multi-camera streaming (api/utils/multi_camera.py): one shared model, batched across cameras
+MULTI_CAMERA_BATCH_SIZE = int(os.environ.get('MULTI_CAMERA_BATCH_SIZE', '8'))  # frames per inference call, one per camera
+MULTI_CAMERA_BATCH_WAIT = 0.01  # seconds a partial batch waits for other cameras' frames
+
+# Metrics (api/utils/metrics.py), served at /api/metrics
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')  # clients allowed to scrape
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'drone_threat.settings')
 
 application = get_wsgi_application()
+
+# Imported once Django is set up
+from api.utils.model_registry import warm_up_on_start  # noqa: E402
+
+warm_up_on_start()